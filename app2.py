@@ -2,7 +2,8 @@ import streamlit as st
 import pandas as pd
 import numpy as np
 import plotly.graph_objects as go
-from plotly.subplots import make_subplots
+
+import growth_core
 
 # Set page config
 st.set_page_config(page_title="Pediatric Growth Chart", layout="wide")
@@ -231,24 +232,6 @@ def create_weight_chart(weight_df, patient_age, patient_weight):
     
     return fig
 
-# Function to determine percentile status
-def get_percentile_status(df, age, measurement, measurement_type):
-    # Find the closest age
-    closest_age_row = df.iloc[(df['age'] - age).abs().argsort()[:1]]
-    
-    if measurement < closest_age_row['P3'].values[0]:
-        return f"Below 3rd percentile ({measurement_type})"
-    elif measurement < closest_age_row['P15'].values[0]:
-        return f"Between 3rd-15th percentile ({measurement_type})"
-    elif measurement < closest_age_row['P50'].values[0]:
-        return f"Between 15th-50th percentile ({measurement_type})"
-    elif measurement < closest_age_row['P85'].values[0]:
-        return f"Between 50th-85th percentile ({measurement_type})"
-    elif measurement < closest_age_row['P97'].values[0]:
-        return f"Between 85th-97th percentile ({measurement_type})"
-    else:
-        return f"Above 97th percentile ({measurement_type})"
-
 # Display patient information
 st.header("Patient Summary")
 col1, col2, col3, col4 = st.columns(4)
@@ -264,8 +247,8 @@ with col4:
 
 # Display percentile information
 st.subheader("Growth Assessment")
-height_percentile = get_percentile_status(boys_height_df, patient_age, patient_height, "height")
-weight_percentile = get_percentile_status(boys_weight_df, patient_age, patient_weight, "weight")
+height_percentile = growth_core.get_percentile_status(boys_height_df, patient_age, patient_height, "height")
+weight_percentile = growth_core.get_percentile_status(boys_weight_df, patient_age, patient_weight, "weight")
 
 col1, col2 = st.columns(2)
 with col1:
@@ -0,0 +1,110 @@
+# Cold-start benchmark: import time and time to first response of each entry point
+#
+# Usage:
+#   python bench_startup.py            # compare with bench_baseline.json
+#   python bench_startup.py --save     # record the current numbers as the baseline
+#
+# Each scenario runs in fresh interpreters under `python -X importtime`, the
+# median of several runs is reported, and the run fails when a scenario is
+# slower than its baseline by more than the tolerance, or when a scoring path
+# imports a module it must not (Plotly, pandas or Streamlit).
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'bench_baseline.json')
+
+# name -> (code run in a fresh interpreter, modules it must not import)
+SCENARIOS = {
+    'score_first_visit': (
+        "import growth_core; growth_core.load_engine().score_visits('Boy', [12.0], [75.7], [9.6])",
+        ('plotly', 'pandas', 'streamlit'),
+    ),
+    'import_service': ("import score_service", ('plotly', 'pandas', 'streamlit')),
+    'import_batch': ("import score_visits", ('plotly', 'streamlit')),
+    'first_chart': (
+        "import growth_core; growth_core.chart_template(growth_core.load_data(), 'Boy', 'height', '0-2 years')",
+        ('streamlit',),
+    ),
+}
+
+# Allowed slowdown against the baseline before the benchmark fails
+TOLERANCE = 0.25
+
+
+def parse_importtime(stderr):
+    """Every imported module, and the cumulative time (ms) of each top-level import, from -X importtime output."""
+    imported, top_level = set(), {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        imported.add(name.strip())
+        # Nested imports are indented by two more spaces per level
+        if not name.startswith('  '):
+            top_level[name.strip()] = int(cumulative) / 1000
+    return imported, top_level
+
+
+def run_scenario(code, runs):
+    """Median wall time (ms), median import time (ms), imported modules and heaviest imports over fresh interpreters."""
+    walls, imports, imported = [], [], set()
+    top_level = {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code],
+                                capture_output=True, text=True, cwd=os.path.dirname(BASELINE_FILE))
+        walls.append((time.perf_counter() - start) * 1000)
+        if result.returncode != 0:
+            raise RuntimeError(f"Scenario failed: {code}\n{result.stderr[-2000:]}")
+        modules, top_level = parse_importtime(result.stderr)
+        imported |= modules
+        imports.append(sum(top_level.values()))
+    heaviest = sorted(top_level.items(), key=lambda item: item[1], reverse=True)[:3]
+    return statistics.median(walls), statistics.median(imports), imported, heaviest
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark cold start of the scoring entry points.")
+    parser.add_argument('--runs', type=int, default=5, help="Fresh interpreters per scenario (default: 5)")
+    parser.add_argument('--save', action='store_true', help="Store the results as the new baseline")
+    args = parser.parse_args(argv)
+
+    baselines = {}
+    if os.path.exists(BASELINE_FILE):
+        with open(BASELINE_FILE) as f:
+            baselines = json.load(f)
+    baseline = baselines.get('startup', {})
+
+    results = {}
+    failures = []
+    for name, (code, forbidden) in SCENARIOS.items():
+        wall, imports, imported, heaviest = run_scenario(code, args.runs)
+        results[name] = {'wall_ms': round(wall, 1), 'import_ms': round(imports, 1)}
+        heavy = ', '.join(f"{module} {ms:.0f}ms" for module, ms in heaviest)
+        print(f"{name:<20} wall {wall:7.1f} ms   imports {imports:7.1f} ms   ({heavy})")
+
+        leaked = sorted(module for module in forbidden if module in imported)
+        if leaked:
+            failures.append(f"{name} imports {', '.join(leaked)}")
+        previous = baseline.get(name)
+        if previous and wall > previous['wall_ms'] * (1 + TOLERANCE):
+            failures.append(f"{name} wall time {wall:.0f} ms vs baseline {previous['wall_ms']:.0f} ms")
+
+    if args.save:
+        baselines['startup'] = results
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {BASELINE_FILE}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
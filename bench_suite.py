@@ -0,0 +1,216 @@
+# Benchmark suite: reference loading, scoring, chart building and link parsing
+#
+# Usage:
+#   python bench_suite.py                      # cohorts of 1e3, 1e5 and 1e7 visits
+#   python bench_suite.py --sizes 1e3,1e5      # quicker run
+#   python bench_suite.py --save               # record the results as the baseline
+#
+# Every stage reports throughput, p50/p99 latency per call and peak traced
+# memory (one extra run under tracemalloc, so timings are not distorted).
+# Cohorts are synthetic and seeded, so runs are comparable. Results are
+# compared with the "suite" section of bench_baseline.json and the run
+# fails when a stage loses more than --tolerance of its throughput or gains
+# that much p50 latency or peak memory.
+import argparse
+import itertools
+import json
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+import growth_core
+import lms
+import series
+from bench_startup import BASELINE_FILE
+
+SEED = 20240101
+
+# Rows scored per engine call in the batch stage (as score_visits.py does per chunk)
+BATCH_ROWS = 250_000
+
+# Per-call stages (single visits, charts, links) are timed on this many calls
+CALLS = 2000
+
+# Sub-millisecond calls are timed in batches lasting at least this long per sample (as timeit does),
+# so timer resolution and scheduling noise do not dominate their latencies
+MIN_SAMPLE_S = 0.001
+
+# p50 latencies below this are not flagged, whatever their relative change (like the 1 MB memory floor)
+LATENCY_FLOOR_MS = 0.05
+
+# Default allowed change against the baseline (loading stages vary ~30% run to run on shared VMs)
+TOLERANCE = 0.35
+
+
+def synthetic_cohort(size, engine, seed=SEED):
+    """Visits with realistic measurements: WHO medians plus normal z-scores, ages 0-60 months."""
+    rng = np.random.default_rng(seed)
+    sex = np.where(rng.random(size) < 0.5, 'Boy', 'Girl')
+    age = np.round(rng.uniform(0, 60, size), 2)
+    cohort = {'sex': sex, 'age': age}
+    for measurement in ('height', 'weight', 'head'):
+        values = np.empty(size)
+        z = np.clip(rng.standard_normal(size), -4, 4)
+        for s in ('Boy', 'Girl'):
+            mask = sex == s
+            L, M, S = engine.tables[(s, measurement, 'age')].lms(age[mask])
+            values[mask] = lms.lms_value(z[mask], L, M, S)
+        cohort[measurement] = np.round(values, 1)
+    return cohort
+
+
+def batch_size(fn, min_time=MIN_SAMPLE_S):
+    """Calls per timed sample: doubled until a batch takes at least min_time."""
+    batch = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        if time.perf_counter() - start >= min_time:
+            return batch
+        batch *= 2
+
+
+def run_stage(fn, calls, items_per_call):
+    """Time calls samples of fn() (each a batch of calls for fast stages); returns the stage's metrics.
+
+    Latencies are per call; one more call runs under tracemalloc.
+    """
+    batch = batch_size(fn)
+    latencies = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        for _ in range(batch):
+            fn()
+        latencies.append((time.perf_counter() - start) / batch)
+    tracemalloc.start()
+    fn()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    latencies = np.array(latencies)
+    return {
+        'items_per_s': round(items_per_call * calls / latencies.sum(), 1),
+        'p50_ms': round(float(np.percentile(latencies, 50)) * 1000, 4),
+        'p99_ms': round(float(np.percentile(latencies, 99)) * 1000, 4),
+        'peak_mb': round(peak / 2**20, 2),
+    }
+
+
+def cohort_stages(cohort, engine, data):
+    """name -> (callable, calls, items per call) for one cohort."""
+    size = len(cohort['age'])
+    sample = np.arange(min(size, CALLS))
+    # Endless, since fast stages run several calls per timed sample
+    visit = itertools.cycle(sample.tolist())
+
+    def score_batch():
+        for start in range(0, size, BATCH_ROWS):
+            end = start + BATCH_ROWS
+            engine.score_visits(cohort['sex'][start:end], cohort['age'][start:end], cohort['height'][start:end],
+                                cohort['weight'][start:end], cohort['head'][start:end])
+
+    template = growth_core.chart_template(data, 'Boy', 'height', '0-2 years')
+
+    def cohort_chart():
+        trace = growth_core.cohort_trace(template, cohort['age'], cohort['height'])
+        growth_core.add_cohort(template, trace)
+
+    def percentile_status():
+        i = next(visit)
+        age_range = "0-2 years" if cohort['age'][i] < 24 else "2-5 years"
+        df = data[growth_core.reference_key(cohort['sex'][i], 'height', age_range)]
+        growth_core.get_percentile_status(df, cohort['age'][i], cohort['height'][i], 'height', cohort['sex'][i], engine)
+
+    batch_calls = 3 if size <= 1_000_000 else 1
+    return {
+        'score_visits_batch': (score_batch, batch_calls, size),
+        'get_percentile_status': (percentile_status, min(size, CALLS), 1),
+        'cohort_chart': (cohort_chart, batch_calls, size),
+    }
+
+
+def fixed_stages(engine, data):
+    """Stages that do not depend on cohort size: name -> (callable, calls, items per call)."""
+    template = growth_core.chart_template(data, 'Boy', 'height', '0-2 years')
+    visits = series.PatientSeries('Boy', engine)
+    visits.add_visits(np.arange(0, 24, 2.0), np.linspace(50, 85, 12), np.linspace(3.5, 12, 12))
+    params = {'name': 'Test', 'age': '18', 'height': '81.2', 'weight': '10.9', 'gender': 'Girl',
+              'age_range': '0-2 years', 'chart': 'Both', 'export': 'png'}
+    return {
+        'load_data': (growth_core.load_data, 50, 1),
+        'load_engine': (growth_core.load_engine, 50, 1),
+        'chart_template': (lambda: growth_core.chart_template(data, 'Boy', 'height', '0-2 years'), 50, 1),
+        'create_height_chart': (lambda: growth_core.create_chart(template, visits, 'height'), CALLS, 1),
+        'link_defaults': (lambda: growth_core.link_defaults(params), CALLS, 1),
+    }
+
+
+def compare(results, baseline, items_per_call, tolerance=TOLERANCE):
+    """Regressions against the baseline, as messages (items_per_call: stage name -> items per call)."""
+    failures = []
+    for name, metrics in results.items():
+        previous = baseline.get(name)
+        if not previous:
+            continue
+        # Mean time per call; throughput of calls faster than the latency floor is not flagged either
+        call_ms = 1000 * items_per_call[name] / metrics['items_per_s']
+        if metrics['items_per_s'] < previous['items_per_s'] * (1 - tolerance) and call_ms > LATENCY_FLOOR_MS:
+            failures.append(f"{name}: {metrics['items_per_s']:,.0f}/s vs baseline {previous['items_per_s']:,.0f}/s")
+        if metrics['p50_ms'] > max(previous['p50_ms'] * (1 + tolerance), LATENCY_FLOOR_MS):
+            failures.append(f"{name}: p50 {metrics['p50_ms']:.3f} ms vs baseline {previous['p50_ms']:.3f} ms")
+        if metrics['peak_mb'] > max(previous['peak_mb'] * (1 + tolerance), 1.0):
+            failures.append(f"{name}: peak {metrics['peak_mb']:.1f} MB vs baseline {previous['peak_mb']:.1f} MB")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark loading, scoring, charts and link parsing.")
+    parser.add_argument('--sizes', default='1e3,1e5,1e7', help="Cohort sizes in visits (default: 1e3,1e5,1e7)")
+    parser.add_argument('--save', action='store_true', help="Store the results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE,
+                        help=f"Allowed relative change before a stage is flagged (default: {TOLERANCE})")
+    args = parser.parse_args(argv)
+    sizes = [int(float(size)) for size in args.sizes.split(',')]
+
+    engine = growth_core.load_engine()
+    data = growth_core.load_data()
+
+    stages = dict(fixed_stages(engine, data))
+    for size in sizes:
+        cohort = synthetic_cohort(size, engine)
+        for name, stage in cohort_stages(cohort, engine, data).items():
+            stages[f'{name}[{size:.0e}]'] = stage
+
+    results = {}
+    print(f"{'stage':<34} {'items/s':>14} {'p50 ms':>10} {'p99 ms':>10} {'peak MB':>9}")
+    for name, (fn, calls, items_per_call) in stages.items():
+        fn()  # warm-up
+        metrics = results[name] = run_stage(fn, calls, items_per_call)
+        print(f"{name:<34} {metrics['items_per_s']:>14,.0f} {metrics['p50_ms']:>10.3f} "
+              f"{metrics['p99_ms']:>10.3f} {metrics['peak_mb']:>9.1f}")
+
+    baselines = {}
+    try:
+        with open(BASELINE_FILE) as f:
+            baselines = json.load(f)
+    except FileNotFoundError:
+        pass
+    failures = compare(results, baselines.get('suite', {}),
+                       {name: stage[2] for name, stage in stages.items()}, args.tolerance)
+
+    if args.save:
+        baselines['suite'] = {**baselines.get('suite', {}), **results}
+        with open(BASELINE_FILE, 'w') as f:
+            json.dump(baselines, f, indent=2, sort_keys=True)
+            f.write('\n')
+        print(f"Saved baseline to {BASELINE_FILE}")
+    for failure in failures:
+        print(f"REGRESSION: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
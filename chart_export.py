@@ -0,0 +1,181 @@
+# Server-side static chart images (PNG/SVG) with a content-addressed disk cache
+#
+# Shared links opened on phones can ask for a pre-rendered image instead of the
+# interactive Plotly chart (add &export=png or &export=svg to the link). Images
+# are stored under the SHA-256 of the exact figure being drawn, so repeat views
+# of the same link are served from disk without re-plotting, and any change to
+# the chart styling produces new keys rather than stale images.
+#
+# The cache is bounded like the render cache: images not viewed for
+# CACHE_MAX_AGE expire, and once the images total more than CACHE_MAX_BYTES
+# the least recently viewed are deleted (a view refreshes an image's
+# modification time, which records its last use).
+#
+# Rendering needs the optional kaleido package (pip install kaleido).
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+
+CACHE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.chart_cache')
+
+EXPORT_FORMATS = ('png', 'svg')
+
+# Bytes of images kept on disk, and seconds an image stays cached since it was last viewed
+CACHE_MAX_BYTES = 256 * 2**20
+CACHE_MAX_AGE = 30 * 24 * 3600
+
+# Pruning deletes down to this fraction of CACHE_MAX_BYTES, so it does not rescan the cache on every new image
+PRUNE_TO = 0.9
+
+# Pixel size of exported charts (layout height is fixed at 500 by the templates)
+EXPORT_WIDTH = 800
+
+
+def image_key(figure, fmt, width=EXPORT_WIDTH):
+    """Content address of one rendered image: hash of the figure and render settings."""
+    payload = json.dumps({'figure': figure, 'format': fmt, 'width': width}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+class ImageCache:
+    """Content-addressed image store on disk (<dir>/<key[:2]>/<key>.<format>), bounded in size and age.
+
+    Several processes may share the directory: each keeps a running total of
+    what it wrote and prunes from a fresh scan once that exceeds max_bytes.
+    """
+
+    def __init__(self, directory=CACHE_DIR, max_bytes=CACHE_MAX_BYTES, max_age=CACHE_MAX_AGE, clock=time.time):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.max_age = max_age
+        self.clock = clock
+        self.lock = threading.Lock()
+        # Bytes on disk as of the last scan plus those written since (None until the first put)
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def path(self, key, fmt):
+        return os.path.join(self.directory, key[:2], f'{key}.{fmt}')
+
+    def get(self, key, fmt):
+        """Cached image bytes, or None on a miss (an expired image is deleted)."""
+        path = self.path(key, fmt)
+        now = self.clock()
+        try:
+            if now - os.stat(path).st_mtime > self.max_age:
+                os.remove(path)
+                with self.lock:
+                    self.expirations += 1
+                    self.misses += 1
+                return None
+            with open(path, 'rb') as f:
+                image = f.read()
+            os.utime(path, (now, now))
+        except FileNotFoundError:
+            with self.lock:
+                self.misses += 1
+            return None
+        with self.lock:
+            self.hits += 1
+        return image
+
+    def put(self, key, fmt, image):
+        """Store image bytes; the rename makes concurrent writers of the same key safe."""
+        path = self.path(key, fmt)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        with os.fdopen(fd, 'wb') as f:
+            f.write(image)
+        now = self.clock()
+        os.utime(tmp_path, (now, now))
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.size = self._disk_size() if self.size is None else self.size + len(image)
+            if self.size > self.max_bytes:
+                self._prune()
+
+    def _images(self):
+        """(last use, bytes, path) of every stored image."""
+        images = []
+        for root, _, files in os.walk(self.directory):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                try:
+                    stat = os.stat(os.path.join(root, name))
+                except FileNotFoundError:
+                    continue
+                images.append((stat.st_mtime, stat.st_size, os.path.join(root, name)))
+        return images
+
+    def _disk_size(self):
+        return sum(size for _, size, _ in self._images())
+
+    def prune(self):
+        """Delete expired images, then the least recently used until within the size budget."""
+        with self.lock:
+            self._prune()
+
+    def _prune(self):
+        # Called with the lock held
+        images = sorted(self._images())
+        total = sum(size for _, size, _ in images)
+        now = self.clock()
+        for last_use, size, path in images:
+            expired = now - last_use > self.max_age
+            # Oldest first: once an image is neither expired nor over budget, neither are the rest
+            if not expired and total <= self.max_bytes * PRUNE_TO:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+            if expired:
+                self.expirations += 1
+            else:
+                self.evictions += 1
+        self.size = total
+
+    def stats(self):
+        """Counters and bytes on disk (as of the last scan and writes), like RenderCache.stats()."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'bytes': self.size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
+
+
+# Shared by every chart_image() call in the process, so the running size total carries over
+DEFAULT_CACHE = ImageCache()
+
+
+def render_image(figure, fmt, width=EXPORT_WIDTH):
+    """Render a figure (dict or go.Figure) to PNG or SVG bytes."""
+    if fmt not in EXPORT_FORMATS:
+        raise ValueError(f"Unsupported export format: {fmt} (expected one of {', '.join(EXPORT_FORMATS)})")
+    import plotly.io as pio
+    return pio.to_image(figure, format=fmt, width=width)
+
+
+def chart_image(figure, fmt, cache=None, width=EXPORT_WIDTH):
+    """Image bytes for a figure, rendered once and then served from the disk cache."""
+    cache = cache or DEFAULT_CACHE
+    key = image_key(figure, fmt, width)
+    image = cache.get(key, fmt)
+    if image is None:
+        image = render_image(figure, fmt, width)
+        cache.put(key, fmt, image)
+    return image
@@ -0,0 +1,247 @@
+# Growth chart figures (WHO percentile curves plus the patient overlay)
+#
+# The percentile curves and layout only depend on sex, measurement and age
+# range, so they are built once as a plain figure dict ("template") and each
+# rerun only adds the patient marker and its two guide lines.
+#
+# Plotly is imported on the first chart_template() call, so importing this
+# module (e.g. from a scoring worker) does not pay Plotly's import cost.
+#
+# Cohorts (clinic audits) are overlaid beneath the curves: small cohorts as
+# a WebGL scatter, large ones as a density heatmap binned here, so the figure
+# sent to the browser has a bounded size however many visits there are.
+#
+# The percentile curves are cropped to the chart's age range and thinned to
+# a point budget per viewport (decimate_curves), so a daily-resolution table
+# (1,857 rows to 60 months) draws the same light, stable figure as a monthly
+# one. Only the drawn lines are thinned; scoring uses the full LMS tables.
+import json
+
+import numpy as np
+
+PERCENTILES = ['P3', 'P15', 'P50', 'P85', 'P97']
+
+# (column, legend name, median) of the lines drawn by default
+PERCENTILE_LINES = [(p, f"{p.replace('P', '')}th percentile", p == 'P50') for p in PERCENTILES]
+
+# Axis ranges and y tick spacing per (measurement type, age range)
+CHART_AXES = {
+    ('height', '0-2 years'): {'x_range': [0, 24], 'y_range': [40, 100], 'y_dtick': 5},
+    ('height', '2-5 years'): {'x_range': [24, 60], 'y_range': [75, 130], 'y_dtick': 5},
+    ('weight', '0-2 years'): {'x_range': [0, 24], 'y_range': [1, 16], 'y_dtick': 1},
+    ('weight', '2-5 years'): {'x_range': [24, 60], 'y_range': [8, 25], 'y_dtick': 1},
+}
+
+# Most points drawn per percentile curve in each age range (about one per week
+# under 2 years, one per fortnight after); monthly tables are drawn as they are
+CURVE_POINTS = {'0-2 years': 105, '2-5 years': 80}
+
+# Curve values are rounded to 0.01 cm/kg, far below a pixel at chart size
+CURVE_DECIMALS = 2
+
+# Cohort overlay: up to this many visits are drawn as points, larger cohorts as density bins
+COHORT_SCATTER_MAX = 5000
+
+# Density bins per month of age, and across the measurement axis
+COHORT_BINS_PER_MONTH = 4
+COHORT_Y_BINS = 100
+
+CHART_TITLES = {
+    'height': ('Height-for-age', 'Height (cm)'),
+    'weight': ('Weight-for-age', 'Weight (kg)'),
+}
+
+
+def decimate_curves(df, x_range, max_points, columns=PERCENTILES):
+    """Curves (columns of df) within x_range, thinned to at most max_points rows.
+
+    Rows are kept at a fixed stride (always including the last one, and one
+    row past each edge of the range so the lines reach the axes), so every
+    point is a table row and the same table always gives the same points.
+    df may be a DataFrame or a dict of arrays; returns {'age': [...],
+    'P3': [...], ...} as plain lists.
+    """
+    ages = np.asarray(df['age'], dtype=float)
+    inside = np.flatnonzero((ages >= x_range[0]) & (ages <= x_range[1]))
+    if len(inside) == 0:
+        return {column: [] for column in ['age'] + list(columns)}
+    rows = np.arange(max(inside[0] - 1, 0), min(inside[-1] + 1, len(ages) - 1) + 1)
+    keep = rows[::max(1, -(-(len(rows) - 1) // (max_points - 1)))]
+    if keep[-1] != rows[-1]:
+        keep = np.append(keep, rows[-1])
+    curves = {'age': np.round(ages[keep], 4).tolist()}
+    for column in columns:
+        curves[column] = np.round(np.asarray(df[column], dtype=float)[keep], CURVE_DECIMALS).tolist()
+    return curves
+
+
+def chart_template(df, measurement_type, age_range, lines=PERCENTILE_LINES):
+    """Percentile curves and layout for one chart as a plain figure dict.
+
+    lines lists the (column, legend name, median) of each curve to draw
+    from df (e.g. curve_sets.curve_lines() for other centiles or SD lines);
+    the median is drawn thicker.
+
+    The dict is JSON-native and carries no expanded layout template, so it
+    can be cached, shared between sessions and handed to st.plotly_chart
+    cheaply. Treat it as read-only; add_patient() returns new dicts.
+    """
+    import plotly.graph_objects as go
+    import plotly.io as pio
+
+    axes = CHART_AXES[(measurement_type, age_range)]
+    title, y_title = CHART_TITLES[measurement_type]
+    curves = decimate_curves(df, axes['x_range'], CURVE_POINTS[age_range], [column for column, _, _ in lines])
+
+    fig = go.Figure()
+
+    # Add percentile lines
+    for column, name, median in lines:
+        fig.add_trace(
+            go.Scatter(
+                x=curves['age'],
+                y=curves[column],
+                mode='lines',
+                name=name,
+                line=dict(
+                    width=3 if median else 2,
+                    dash='solid'
+                )
+            )
+        )
+
+    # Configure layout
+    fig.update_layout(
+        title=f'{title} ({age_range})',
+        xaxis=dict(
+            title='Age (months)',
+            dtick=3 if age_range == "0-2 years" else 6,  # Set tick marks every 3 or 6 months
+            gridcolor='lightgray',
+            gridwidth=1,
+            range=axes['x_range']
+        ),
+        yaxis=dict(
+            title=y_title,
+            dtick=axes['y_dtick'],
+            gridcolor='lightgray',
+            gridwidth=1,
+            range=axes['y_range']
+        ),
+        legend=dict(
+            yanchor="top",
+            y=0.99,
+            xanchor="left",
+            x=0.01
+        ),
+        margin=dict(l=60, r=20, t=50, b=60),
+        height=500,
+        hovermode='closest'
+    )
+
+    # Round-trip through JSON for plain lists, and drop the expanded default
+    # template: Plotly re-applies it on render, and validating it is most of
+    # the cost of every st.plotly_chart call
+    template = json.loads(pio.to_json(fig, validate=False))
+    template['layout'].pop('template', None)
+    return template
+
+
+def add_patient(template, patient_age, measurement):
+    """New figure dict: the cached template plus the patient marker(s) and guide lines.
+
+    patient_age and measurement may also be arrays of visits (e.g. from a
+    PatientSeries); they are drawn as a single trace and the guide lines
+    mark the latest visit.
+    """
+    x_min = template['layout']['xaxis']['range'][0]
+    y_min = template['layout']['yaxis']['range'][0]
+
+    ages = np.atleast_1d(np.asarray(patient_age, dtype=float))
+    values = np.atleast_1d(np.asarray(measurement, dtype=float))
+    measured = ~np.isnan(ages) & ~np.isnan(values)
+    ages, values = ages[measured].tolist(), values[measured].tolist()
+    patient_age, measurement = (ages[-1], values[-1]) if ages else (x_min, y_min)
+
+    patient_trace = {
+        'type': 'scatter',
+        'x': ages,
+        'y': values,
+        'mode': 'lines+markers' if len(ages) > 1 else 'markers',
+        'name': 'Patient',
+        'line': {'color': 'red', 'width': 1},
+        'marker': {'size': 12, 'color': 'red', 'symbol': 'circle'},
+    }
+    guide_line = {'color': 'red', 'width': 1, 'dash': 'dash'}
+    shapes = [
+        {'type': 'line', 'x0': x_min, 'y0': measurement, 'x1': patient_age, 'y1': measurement, 'line': guide_line},
+        {'type': 'line', 'x0': patient_age, 'y0': y_min, 'x1': patient_age, 'y1': measurement, 'line': guide_line},
+    ]
+
+    # Shallow copies only: the curve traces are shared with the template
+    return {
+        'data': template['data'] + [patient_trace],
+        'layout': dict(template['layout'], shapes=shapes),
+    }
+
+
+def create_height_chart(height_df, patient_age, patient_height, age_range):
+    """Create a height-for-age chart with WHO percentile curves."""
+    return add_patient(chart_template(height_df, 'height', age_range), patient_age, patient_height)
+
+
+def create_weight_chart(weight_df, patient_age, patient_weight, age_range):
+    """Create a weight-for-age chart with WHO percentile curves."""
+    return add_patient(chart_template(weight_df, 'weight', age_range), patient_age, patient_weight)
+
+
+def cohort_trace(template, ages, values):
+    """Trace for a cohort of visits on a chart template's axes.
+
+    Up to COHORT_SCATTER_MAX visits become a WebGL scatter; larger cohorts
+    are counted into a grid of age x measurement bins and drawn as a
+    heatmap (empty bins transparent), whose size depends only on the grid.
+    Visits outside the chart's axes are left out.
+    """
+    x_min, x_max = template['layout']['xaxis']['range']
+    y_min, y_max = template['layout']['yaxis']['range']
+    ages = np.asarray(ages, dtype=float)
+    values = np.asarray(values, dtype=float)
+    with np.errstate(invalid='ignore'):
+        shown = (ages >= x_min) & (ages <= x_max) & (values >= y_min) & (values <= y_max)
+    ages, values = ages[shown], values[shown]
+
+    if len(ages) <= COHORT_SCATTER_MAX:
+        return {
+            'type': 'scattergl',
+            'x': ages.tolist(),
+            'y': values.tolist(),
+            'mode': 'markers',
+            'name': f'Cohort ({len(ages):,} visits)',
+            'marker': {'size': 4, 'color': 'rgba(70, 100, 160, 0.35)'},
+            'hoverinfo': 'skip',
+        }
+
+    # Bin index per visit from the uniform grid (one bincount instead of a sort per axis)
+    x_bins = int(round((x_max - x_min) * COHORT_BINS_PER_MONTH))
+    x_step, y_step = (x_max - x_min) / x_bins, (y_max - y_min) / COHORT_Y_BINS
+    column = np.minimum(((ages - x_min) / x_step).astype(np.intp), x_bins - 1)
+    row = np.minimum(((values - y_min) / y_step).astype(np.intp), COHORT_Y_BINS - 1)
+    counts = np.bincount(row * x_bins + column, minlength=x_bins * COHORT_Y_BINS).reshape(COHORT_Y_BINS, x_bins)
+    z = np.where(counts > 0, counts, np.nan)
+
+    return {
+        'type': 'heatmap',
+        'x': np.round(x_min + (np.arange(x_bins) + 0.5) * x_step, 4).tolist(),
+        'y': np.round(y_min + (np.arange(COHORT_Y_BINS) + 0.5) * y_step, 4).tolist(),
+        'z': [[None if v != v else int(v) for v in line] for line in z.tolist()],
+        'name': f'Cohort ({len(ages):,} visits)',
+        'colorscale': 'Blues',
+        'colorbar': {'title': {'text': 'Visits'}, 'thickness': 12},
+        'showlegend': True,
+        'hovertemplate': 'Age %{x:.1f} months<br>%{y:.1f}: %{z} visits<extra></extra>',
+    }
+
+
+def add_cohort(figure, trace):
+    """New figure dict with a cohort_trace() drawn beneath the curves and patient."""
+    return {'data': [trace] + figure['data'], 'layout': figure['layout']}
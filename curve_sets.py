@@ -0,0 +1,135 @@
+# Reference curve sets for the charts, computed on demand from the WHO LMS parameters
+#
+# A curve set is a named preset from CURVE_SETS or any ('percentile', centiles)
+# / ('sd', z-scores) tuple. Each line is the LMS value at its z-score, computed
+# for every tabulated age of a chart's age range in one vectorized call, and
+# the curves are memoized per (reference tables, curve set): keyed on the
+# contents of the LMS tables rather than the engine, so switching sets in the
+# app builds each one once and the cache holds no engine alive.
+#
+#   curves = reference_curves(engine, 'Girl', 'height', "SD lines (-3 to +3)", (0, 24))
+#   curves['age'], curves['SD-2'], ...
+import functools
+
+import numpy as np
+
+import lms
+
+# Sets offered in the app: name -> (kind, values), centiles in percent or SD lines as z-scores
+CURVE_SETS = {
+    "WHO percentiles (3rd-97th)": ('percentile', (3, 15, 50, 85, 97)),
+    "All WHO centiles (0.1st-99.9th)": ('percentile', (0.1, 1, 3, 5, 10, 15, 25, 50, 75, 85, 90, 95, 97, 99, 99.9)),
+    "SD lines (-3 to +3)": ('sd', (-3, -2, -1, 0, 1, 2, 3)),
+}
+DEFAULT_CURVE_SET = "WHO percentiles (3rd-97th)"
+
+# Newton steps when inverting the normal CDF (converges long before this from z = 0)
+NEWTON_STEPS = 40
+
+# Memoized curve sets kept (4 measurements x 2 sexes x 2 age ranges x a few sets)
+CURVE_CACHE_SIZE = 256
+
+
+def curve_spec(curve_set):
+    """(kind, values) of a curve set name or tuple; raises KeyError for unknown names."""
+    if curve_set is None:
+        curve_set = DEFAULT_CURVE_SET
+    kind, values = CURVE_SETS[curve_set] if isinstance(curve_set, str) else curve_set
+    if kind not in ('percentile', 'sd'):
+        raise ValueError(f"Unknown curve set kind: {kind}")
+    return kind, tuple(sorted(float(v) for v in values))
+
+
+def is_default(curve_set):
+    return curve_spec(curve_set) == curve_spec(DEFAULT_CURVE_SET)
+
+
+def centile_zscores(centiles):
+    """Z-scores of centiles (percent, strictly between 0 and 100) of the standard normal."""
+    p = np.asarray(centiles, dtype=float)
+    z = np.zeros_like(p)
+    # Newton on the same CDF the engine scores with, so a line's centile round-trips exactly
+    for _ in range(NEWTON_STEPS):
+        z -= (lms.zscore_to_percentile(z) - p) / 100 / (np.exp(-z * z / 2) / np.sqrt(2 * np.pi))
+    return z
+
+
+def ordinal(value):
+    """'3rd', '0.1st', '99.9th', '11th'."""
+    text = f"{value:g}"
+    digits = text.replace('.', '')
+    if digits[-2:] in ('11', '12', '13'):
+        return f"{text}th"
+    return text + {'1': 'st', '2': 'nd', '3': 'rd'}.get(digits[-1], 'th')
+
+
+def line_zscores(curve_set):
+    kind, values = curve_spec(curve_set)
+    return centile_zscores(values) if kind == 'percentile' else np.array(values)
+
+
+def curve_lines(curve_set):
+    """(column, legend name, median) of each line of a curve set, lowest first."""
+    kind, values = curve_spec(curve_set)
+    if kind == 'percentile':
+        return [(f"P{v:g}", f"{ordinal(v)} percentile", v == 50) for v in values]
+    return [(f"SD{v:+g}" if v else "SD0", f"{v:+g} SD" if v else "0 SD (median)", v == 0) for v in values]
+
+
+def band_labels(curve_set):
+    """Assessment label of each band between the lines, e.g. 'Between 3rd-15th percentile'."""
+    kind, values = curve_spec(curve_set)
+    if kind == 'percentile':
+        names = [ordinal(v) for v in values]
+        return ([f"Below {names[0]} percentile"] +
+                [f"Between {low}-{high} percentile" for low, high in zip(names, names[1:])] +
+                [f"Above {names[-1]} percentile"])
+    names = [f"{v:+g} SD" if v else "0 SD" for v in values]
+    return ([f"Below {names[0]}"] +
+            [f"Between {low} and {high}" for low, high in zip(names, names[1:])] +
+            [f"Above {names[-1]}"])
+
+
+def status_labels(z, percentile, measurement_type, curve_set=None):
+    """Assessment label per visit in the bands of a curve set (same wording as get_percentile_status).
+
+    The default set keeps lms.percentile_labels; other sets band the z-scores
+    by their lines' z-scores.
+    """
+    if is_default(curve_set):
+        return lms.percentile_labels(percentile, measurement_type)
+    z = np.asarray(z, dtype=float)
+    labels = np.array([f"{label} ({measurement_type})" for label in band_labels(curve_set)] +
+                      [f"No data available for {measurement_type}"])
+    band = np.searchsorted(line_zscores(curve_set), z, side='right')
+    band = np.where(np.isnan(z), len(labels) - 1, band)
+    return labels[band]
+
+
+def reference_curves(engine, sex, measurement_type, curve_set, x_range):
+    """Lines of a curve set over an age range: {'age': ages, '<column>': values, ...} (read-only arrays).
+
+    Uses the engine's own band tables that overlap x_range, so a 0-2 year
+    chart ends on the recumbent length values at 24 months and a 2-5 year
+    chart starts on the standing height ones.
+    """
+    bands = [band for band in engine.bands[(sex, measurement_type, 'age')]
+             if band.min_age < x_range[1] and band.max_age > x_range[0]]
+    # The tables' own bytes identify them (a few KB): equal tables from any engine share an entry
+    key = tuple(tuple(column.astype(float).tobytes() for column in (band.ages, band.L, band.M, band.S))
+                for band in bands)
+    return _reference_curves(key, curve_spec(curve_set))
+
+
+@functools.lru_cache(maxsize=CURVE_CACHE_SIZE)
+def _reference_curves(bands, spec):
+    bands = [lms.LMSTable(*(np.frombuffer(column) for column in band)) for band in bands]
+    table = lms.LMSTable.spanning(bands) if len(bands) > 1 else bands[0]
+    # One broadcast call: lines x ages
+    values = lms.lms_value(line_zscores(spec)[:, None], table.L, table.M, table.S)
+    curves = {'age': table.ages.copy()}
+    for (column, _, _), line in zip(curve_lines(spec), values):
+        curves[column] = line
+    for array in curves.values():
+        array.setflags(write=False)
+    return curves
@@ -0,0 +1,298 @@
+# Streamlit-free core of the growth chart apps: reference data, scoring and chart helpers
+#
+# Everything here can be imported from workers, batch jobs and tests without
+# starting Streamlit; the apps wrap these functions with st.cache_* and
+# render the results. Plotly and pandas are only imported when a chart or
+# the percentile DataFrames are built; scoring needs NumPy alone.
+import warnings
+
+import curve_sets
+import refcache
+from chart_export import EXPORT_FORMATS
+
+
+def load_data():
+    """WHO percentile curves (age, P3-P97) per sex, measurement and age range, as DataFrames.
+
+    Missing tables fall back to approximate data (or empty frames) with a warning.
+    """
+    import pandas as pd
+
+    # WHO length-for-age (0-24 months) from the compiled reference cache or the CSV files
+    boys_height_0_2_table = refcache.read_table('tab_lhfa_boys_p_0_2')
+    girls_height_0_2_table = refcache.read_table('tab_lhfa_girls_p_0_2')
+    if boys_height_0_2_table is not None and girls_height_0_2_table is not None:
+        boys_height_0_2 = {'age': boys_height_0_2_table['Month'].tolist(),
+                           **{p: boys_height_0_2_table[p].tolist() for p in ['P3', 'P15', 'P50', 'P85', 'P97']}}
+        girls_height_0_2 = {'age': girls_height_0_2_table['Month'].tolist(),
+                            **{p: girls_height_0_2_table[p].tolist() for p in ['P3', 'P15', 'P50', 'P85', 'P97']}}
+    else:
+        warnings.warn("Length-for-age CSV files not found - using approximate data for 0-2 years range.")
+
+        # Approximate height data for 0-2 years (monthly)
+        boys_height_0_2 = {
+            'age': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24],
+            'P3': [46.3, 51.1, 54.7, 57.6, 59.9, 61.9, 63.6, 65.1, 66.5, 67.8, 69.0, 70.2, 71.3, 72.4, 73.4, 74.4, 75.4, 76.4, 77.4, 78.3, 79.2, 80.1, 81.0, 81.9, 82.7],
+            'P15': [48.0, 52.9, 56.6, 59.6, 62.0, 64.0, 65.8, 67.4, 68.9, 70.2, 71.5, 72.7, 73.9, 75.0, 76.1, 77.1, 78.2, 79.2, 80.2, 81.2, 82.1, 83.0, 84.0, 84.9, 85.7],
+            'P50': [49.9, 54.7, 58.4, 61.4, 63.9, 65.9, 67.6, 69.2, 70.6, 72.0, 73.3, 74.5, 75.7, 76.9, 78.0, 79.1, 80.2, 81.2, 82.3, 83.2, 84.2, 85.1, 86.0, 86.9, 87.8],
+            'P85': [51.8, 56.6, 60.4, 63.5, 66.0, 68.1, 69.8, 71.5, 73.0, 74.4, 75.8, 77.1, 78.3, 79.5, 80.6, 81.8, 82.9, 83.9, 85.0, 86.0, 87.0, 88.0, 89.0, 89.9, 90.9],
+            'P97': [53.4, 58.2, 62.1, 65.2, 67.8, 70.0, 71.8, 73.5, 75.0, 76.5, 77.9, 79.2, 80.5, 81.8, 83.0, 84.2, 85.3, 86.4, 87.5, 88.6, 89.6, 90.7, 91.7, 92.7, 93.7]
+        }
+
+        girls_height_0_2 = {
+            'age': [0, 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11, 12, 13, 14, 15, 16, 17, 18, 19, 20, 21, 22, 23, 24],
+            'P3': [45.6, 50.0, 53.2, 55.8, 58.0, 59.9, 61.5, 63.0, 64.4, 65.7, 67.0, 68.2, 69.4, 70.5, 71.6, 72.6, 73.7, 74.7, 75.7, 76.7, 77.6, 78.6, 79.6, 80.5, 81.4],
+            'P15': [47.0, 51.7, 55.0, 57.7, 60.0, 61.9, 63.6, 65.1, 66.5, 67.9, 69.2, 70.4, 71.6, 72.8, 74.0, 75.1, 76.2, 77.2, 78.3, 79.3, 80.3, 81.3, 82.3, 83.2, 84.2],
+            'P50': [49.1, 53.7, 57.1, 59.8, 62.1, 64.0, 65.7, 67.3, 68.7, 70.1, 71.5, 72.8, 74.0, 75.2, 76.4, 77.5, 78.6, 79.7, 80.7, 81.7, 82.7, 83.7, 84.6, 85.6, 86.6],
+            'P85': [51.1, 55.7, 59.1, 61.9, 64.3, 66.2, 68.0, 69.6, 71.1, 72.6, 73.9, 75.2, 76.5, 77.7, 78.9, 80.0, 81.2, 82.3, 83.3, 84.4, 85.4, 86.4, 87.4, 88.4, 89.3],
+            'P97': [52.7, 57.4, 60.9, 63.8, 66.2, 68.2, 70.0, 71.6, 73.2, 74.7, 76.0, 77.4, 78.7, 79.9, 81.2, 82.3, 83.5, 84.6, 85.7, 86.8, 87.8, 88.9, 89.9, 90.9, 91.9]
+        }
+
+    # WHO weight-for-age (0-60 months) from the compiled reference cache or the CSV files
+    boys_weight_table = refcache.read_table('tab_wfa_boys_p_0_5')
+    girls_weight_table = refcache.read_table('tab_wfa_girls_p_0_5')
+    
+    # Try to load 2-5 years data from CSV
+    try:
+        # Read from the compiled reference cache (memory-mapped), or the CSV files if it isn't built
+        boys_height_2_5_table = refcache.read_table('tab_lhfa_boys_p_2_5')
+        girls_height_2_5_table = refcache.read_table('tab_lhfa_girls_p_2_5')
+        if boys_height_2_5_table is not None and girls_height_2_5_table is not None:
+            boys_height_2_5_df = pd.DataFrame(boys_height_2_5_table)
+            girls_height_2_5_df = pd.DataFrame(girls_height_2_5_table)
+            
+            # Extract relevant columns
+            boys_height_2_5 = {
+                'age': boys_height_2_5_df['Month'].tolist(),
+                'P3': boys_height_2_5_df['P3'].tolist(),
+                'P15': boys_height_2_5_df['P15'].tolist(),
+                'P50': boys_height_2_5_df['P50'].tolist(),
+                'P85': boys_height_2_5_df['P85'].tolist(),
+                'P97': boys_height_2_5_df['P97'].tolist()
+            }
+            
+            girls_height_2_5 = {
+                'age': girls_height_2_5_df['Month'].tolist(),
+                'P3': girls_height_2_5_df['P3'].tolist(),
+                'P15': girls_height_2_5_df['P15'].tolist(),
+                'P50': girls_height_2_5_df['P50'].tolist(),
+                'P85': girls_height_2_5_df['P85'].tolist(),
+                'P97': girls_height_2_5_df['P97'].tolist()
+            }
+        else:
+            # Fallback data if CSV files are not found
+            warnings.warn("CSV files not found - using approximate data for 2-5 years range.")
+            
+            # Approximate height data for 2-5 years
+            boys_height_2_5 = {
+                'age': list(range(24, 61, 3)),  # 24-60 months, every 3 months
+                'P3': [82.7, 85.5, 88.2, 90.9, 93.5, 96.1, 98.7, 101.0, 103.3, 105.6, 107.7, 109.8, 111.8],
+                'P15': [85.7, 88.6, 91.5, 94.3, 97.0, 99.6, 102.2, 104.6, 107.0, 109.3, 111.6, 113.8, 116.0],
+                'P50': [87.8, 90.9, 94.0, 97.0, 99.9, 102.7, 105.4, 108.0, 110.5, 113.0, 115.4, 117.7, 120.0],
+                'P85': [90.9, 94.2, 97.4, 100.5, 103.5, 106.4, 109.2, 112.0, 114.7, 117.3, 119.8, 122.3, 124.7],
+                'P97': [93.7, 97.1, 100.4, 103.7, 106.8, 109.8, 112.7, 115.6, 118.3, 121.0, 123.6, 126.1, 128.6]
+            }
+            
+            girls_height_2_5 = {
+                'age': list(range(24, 61, 3)),  # 24-60 months, every 3 months
+                'P3': [81.4, 84.1, 86.7, 89.3, 91.8, 94.2, 96.6, 98.9, 101.1, 103.3, 105.4, 107.5, 109.5],
+                'P15': [84.2, 87.0, 89.8, 92.5, 95.1, 97.7, 100.2, 102.6, 104.9, 107.2, 109.4, 111.6, 113.7],
+                'P50': [86.6, 89.6, 92.5, 95.4, 98.1, 100.8, 103.4, 105.9, 108.4, 110.8, 113.1, 115.4, 117.6],
+                'P85': [89.3, 92.4, 95.4, 98.4, 101.3, 104.1, 106.8, 109.5, 112.0, 114.5, 116.9, 119.3, 121.6],
+                'P97': [91.9, 95.1, 98.2, 101.2, 104.2, 107.1, 109.9, 112.7, 115.3, 117.9, 120.4, 122.8, 125.2]
+            }
+    except Exception as e:
+        warnings.warn(f"Error loading data: {e}")
+        # Fallback to approximate data
+        # (same as above)
+        
+    # Convert to DataFrames
+    boys_height_0_2_df = pd.DataFrame(boys_height_0_2)
+    girls_height_0_2_df = pd.DataFrame(girls_height_0_2)
+    
+    if 'boys_height_2_5' in locals():
+        boys_height_2_5_df = pd.DataFrame(boys_height_2_5)
+        girls_height_2_5_df = pd.DataFrame(girls_height_2_5)
+    else:
+        # Create empty DataFrames with the same structure
+        boys_height_2_5_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+        girls_height_2_5_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+    
+    # Split the weight tables at 24 months like the height tables (both include the 24-month row)
+    if boys_weight_table is not None and girls_weight_table is not None:
+        boys_weight_df = pd.DataFrame(boys_weight_table).rename(columns={'Month': 'age'})[['age', 'P3', 'P15', 'P50', 'P85', 'P97']]
+        girls_weight_df = pd.DataFrame(girls_weight_table).rename(columns={'Month': 'age'})[['age', 'P3', 'P15', 'P50', 'P85', 'P97']]
+        boys_weight_0_2_df = boys_weight_df[boys_weight_df['age'] <= 24].reset_index(drop=True)
+        girls_weight_0_2_df = girls_weight_df[girls_weight_df['age'] <= 24].reset_index(drop=True)
+        boys_weight_2_5_df = boys_weight_df[boys_weight_df['age'] >= 24].reset_index(drop=True)
+        girls_weight_2_5_df = girls_weight_df[girls_weight_df['age'] >= 24].reset_index(drop=True)
+    else:
+        warnings.warn("Weight-for-age CSV files not found - weight charts are unavailable.")
+        boys_weight_0_2_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+        girls_weight_0_2_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+        boys_weight_2_5_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+        girls_weight_2_5_df = pd.DataFrame(columns=['age', 'P3', 'P15', 'P50', 'P85', 'P97'])
+    
+    return {
+        'boys_height_0_2': boys_height_0_2_df,
+        'girls_height_0_2': girls_height_0_2_df,
+        'boys_weight_0_2': boys_weight_0_2_df,
+        'girls_weight_0_2': girls_weight_0_2_df,
+        'boys_height_2_5': boys_height_2_5_df,
+        'girls_height_2_5': girls_height_2_5_df,
+        'boys_weight_2_5': boys_weight_2_5_df,
+        'girls_weight_2_5': girls_weight_2_5_df
+    }
+
+
+def load_engine():
+    """LMS scoring engine (memory-mapped reference cache when built, otherwise the CSVs)."""
+    return refcache.load_engine()
+
+
+def format_age(age_months):
+    """Convert age to display format, e.g. '1 year, 3 months'."""
+    if age_months < 12:
+        return f"{age_months} month{'s' if age_months != 1 else ''}"
+    elif age_months % 12 == 0:
+        years = age_months // 12
+        return f"{years} year{'s' if years != 1 else ''}"
+    else:
+        years = age_months // 12
+        months = age_months % 12
+        return f"{years} year{'s' if years != 1 else ''}, {months} month{'s' if months != 1 else ''}"
+
+
+def get_percentile_status(df, age, measurement, measurement_type, gender=None, engine=None, curve_set=None):
+    """Determine which percentile range the patient falls into.
+
+    curve_set (see curve_sets.CURVE_SETS) bands the result by other centiles
+    or SD lines; it needs the LMS engine.
+    """
+    # Use the exact LMS engine when the WHO tables carry L/M/S for this measurement
+    if gender is not None and engine is not None and engine.has_indicator(gender, measurement_type):
+        if not curve_sets.is_default(curve_set):
+            z, percentile = engine.score(gender, age, measurement, measurement_type)
+            return str(curve_sets.status_labels(z, percentile, measurement_type, curve_set)[0])
+        return str(engine.percentile_status(gender, age, measurement, measurement_type)[0])
+    
+    # Find the closest age
+    closest_age_idx = (df['age'] - age).abs().idxmin() if not df.empty else None
+    
+    if closest_age_idx is None:
+        return f"No data available for {measurement_type}"
+    
+    closest_age_row = df.loc[closest_age_idx]
+    
+    if measurement < closest_age_row['P3']:
+        return f"Below 3rd percentile ({measurement_type})"
+    elif measurement < closest_age_row['P15']:
+        return f"Between 3rd-15th percentile ({measurement_type})"
+    elif measurement < closest_age_row['P50']:
+        return f"Between 15th-50th percentile ({measurement_type})"
+    elif measurement < closest_age_row['P85']:
+        return f"Between 50th-85th percentile ({measurement_type})"
+    elif measurement < closest_age_row['P97']:
+        return f"Between 85th-97th percentile ({measurement_type})"
+    else:
+        return f"Above 97th percentile ({measurement_type})"
+
+
+def link_defaults(query_params):
+    """Patient defaults from a shared link's query parameters (a dict or st.query_params)."""
+    export = query_params.get("export")
+    curves = query_params.get("curves")
+    return {
+        'age_range': query_params.get("age_range", "0-2 years"),
+        'gender': query_params.get("gender", "Boy"),
+        'name': query_params.get("name", ""),
+        'age': int(query_params.get("age", 12)) if "age" in query_params else 12,
+        'height': float(query_params.get("height", 75.0)) if "height" in query_params else 75.0,
+        'weight': float(query_params.get("weight", 10.0)) if "weight" in query_params else 10.0,
+        'chart': query_params.get("chart", "Both"),
+        'curves': curves if curves in curve_sets.CURVE_SETS else curve_sets.DEFAULT_CURVE_SET,
+        'export': export if export in EXPORT_FORMATS else None,
+    }
+
+
+def reference_key(gender, measurement_type, age_range):
+    """Key of one percentile table in the load_data() dict, e.g. 'boys_height_0_2'."""
+    sex_key = 'boys' if gender == "Boy" else 'girls'
+    range_key = '0_2' if age_range == "0-2 years" else '2_5'
+    return f'{sex_key}_{measurement_type}_{range_key}'
+
+
+def chart_template(data, gender, measurement_type, age_range, curve_set=None, engine=None):
+    """Cacheable percentile curves and layout for one chart (see charts.chart_template).
+
+    Other curve sets than the default are computed from the engine's LMS
+    tables (curve_sets.reference_curves); without them the default is drawn.
+    """
+    import charts
+    if (curve_sets.is_default(curve_set) or engine is None
+            or not engine.has_indicator(gender, measurement_type)):
+        return charts.chart_template(data[reference_key(gender, measurement_type, age_range)],
+                                     measurement_type, age_range)
+    x_range = charts.CHART_AXES[(measurement_type, age_range)]['x_range']
+    curves = curve_sets.reference_curves(engine, gender, measurement_type, curve_set, x_range)
+    return charts.chart_template(curves, measurement_type, age_range, curve_sets.curve_lines(curve_set))
+
+
+def create_chart(template, visits, measurement_type):
+    """Chart figure dict: a chart template plus every visit of a PatientSeries."""
+    import charts
+    return charts.add_patient(template, visits.ages, visits.values(measurement_type))
+
+
+def cohort_trace(template, ages, values):
+    """Bounded-size cohort overlay (scatter or density bins) for a chart template (see charts.cohort_trace)."""
+    import charts
+    return charts.cohort_trace(template, ages, values)
+
+
+def add_cohort(figure, trace):
+    """Chart figure dict with a cohort overlay beneath the curves and patient."""
+    import charts
+    return charts.add_cohort(figure, trace)
+
+
+# Charts shown for each "Chart Type" choice
+CHART_CHOICES = {
+    "Height-for-age": ("height",),
+    "Weight-for-age": ("weight",),
+    "Both": ("height", "weight"),
+}
+
+
+def render_view(data, engine, gender, age_range, age, height, weight, head=None, chart="Both", template=None,
+                curve_set=None):
+    """Everything the app computes for one visit, as a read-only dict (cacheable per render_cache.render_key).
+
+    template(gender, measurement_type, age_range, curve_set) supplies chart
+    templates (defaults to building them from data and the engine).
+    curve_set picks the chart lines and the bands of the assessment labels.
+    """
+    import lms
+    import series
+
+    template = template or (lambda g, m, r, c: chart_template(data, g, m, r, c, engine))
+    indicators = engine.score_visits(gender, age, height, weight, head)
+    visits = series.PatientSeries(gender, engine)
+    visits.add_visits(age, height, weight)
+    return {
+        'age': format_age(age),
+        'height_status': get_percentile_status(data[reference_key(gender, 'height', age_range)],
+                                               age, height, 'height', gender, engine, curve_set),
+        'weight_status': get_percentile_status(data[reference_key(gender, 'weight', age_range)],
+                                               age, weight, 'weight', gender, engine, curve_set),
+        'head_status': (str(curve_sets.status_labels(*indicators['head'], lms.indicator_name('head'), curve_set)[0])
+                        if 'head' in indicators else None),
+        'bmi': weight / (height / 100) ** 2,
+        'bmi_z': float(indicators['bmi'][0][0]),
+        'bmi_status': str(curve_sets.status_labels(*indicators['bmi'], lms.indicator_name('bmi'), curve_set)[0]),
+        'wfl_status': str(curve_sets.status_labels(*indicators['weight_for_length'],
+                                                   lms.indicator_name('weight_for_length', age), curve_set)[0]),
+        'charts': {measurement_type: create_chart(template(gender, measurement_type, age_range, curve_set),
+                                                  visits, measurement_type)
+                   for measurement_type in CHART_CHOICES.get(chart, CHART_CHOICES["Both"])},
+    }
@@ -0,0 +1,262 @@
+# Bulk import of historical visits into the patient store
+#
+# Usage:
+#   python import_visits.py history_2015_2024.csv
+#   python import_visits.py history_*.parquet --db patients.db --chunk-size 500000
+#
+# Visits are read in chunks, scored with one vectorized call per chunk and
+# written in one transaction per chunk together with the import's progress
+# (the imports table), so an interrupted import resumes after its last
+# committed chunk when it is run again. Each chunk's transaction takes the
+# write lock up front (BEGIN IMMEDIATE), so visits saved from the app while
+# an import runs wait for the chunk instead of colliding with its ids; visit
+# ids are assigned from the current maximum inside that transaction, so a
+# chunk is written with plain appends. The indexes stay in place during the
+# load: the patient/date index is the one the app's history() looks visits
+# up by while an import runs.
+import argparse
+import hashlib
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import patient_store
+import score_visits
+
+CHECKPOINTS = """
+CREATE TABLE IF NOT EXISTS imports (
+    source TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER,
+    head_sha256 TEXT,
+    rows_done INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0
+);
+"""
+
+# Page cache for the load (negative = KiB)
+CACHE_KIB = 256 * 1024
+
+# Leading bytes of a file hashed into its checkpoint
+HEAD_BYTES = 1024 * 1024
+
+# Patient keys looked up per query (below SQLite's bound parameter limit)
+KEY_BATCH = 500
+
+
+def patient_keys(keys):
+    """Patient keys as text.
+
+    Integer ids read as float64 (a numeric id column with gaps) lose the
+    '.0', so 123 and 123.0 are the same patient.
+    """
+    if pd.api.types.is_float_dtype(keys.dtype) and (keys.dropna() % 1 == 0).all():
+        keys = keys.astype('Int64')
+    return keys.astype(str).to_numpy(dtype=object)
+
+
+def file_identity(path):
+    """(size, mtime_ns, sha256 of the first HEAD_BYTES) identifying a file's contents for resuming."""
+    stat = os.stat(path)
+    with open(path, 'rb') as f:
+        head = hashlib.sha256(f.read(HEAD_BYTES)).hexdigest()
+    return stat.st_size, stat.st_mtime_ns, head
+
+
+def visit_dates(chunk, args):
+    """ISO visit dates ('' where there is no usable date)."""
+    if args.date_col not in chunk.columns:
+        return np.full(len(chunk), '', dtype=object)
+    dates = pd.to_datetime(chunk[args.date_col], errors='coerce')
+    return dates.dt.strftime('%Y-%m-%d').fillna('').to_numpy(dtype=object)
+
+
+class VisitImporter:
+    """Appends scored visits from CSV/Parquet files to a PatientStore, resumably."""
+
+    def __init__(self, store, args, report=None):
+        self.store = store
+        self.db = store.db
+        self.args = args
+        self.report = report or (lambda message: print(message, file=sys.stderr))
+        self.db.executescript(CHECKPOINTS)
+        # Checkpoint tables from before mtime/head hashes were recorded
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(imports)")}
+        with self.db:
+            for column, sql_type in [('mtime_ns', 'INTEGER'), ('head_sha256', 'TEXT')]:
+                if column not in columns:
+                    self.db.execute(f"ALTER TABLE imports ADD COLUMN {column} {sql_type}")
+        self.db.execute(f'PRAGMA cache_size=-{CACHE_KIB}')
+        self.db.execute('PRAGMA temp_store=MEMORY')
+        # Patient ids never change once assigned, so known keys are resolved in memory
+        self.patient_ids = dict(self.db.execute("SELECT patient_key, id FROM patients"))
+        # Totals over every file imported by this importer
+        self.rows = 0
+        self.visits = 0
+
+    def checkpoint(self, path):
+        """Rows of path already imported, or None when it was imported completely.
+
+        A file is the same one when its size, modification time and leading
+        bytes all match. Raises ValueError when the file changed since an
+        interrupted import of it.
+        """
+        source, identity = os.path.abspath(path), file_identity(path)
+        row = self.db.execute("SELECT size, mtime_ns, head_sha256, rows_done, completed FROM imports "
+                              "WHERE source = ?", (source,)).fetchone()
+        if row is None:
+            with self.db:
+                self.db.execute("INSERT INTO imports (source, size, mtime_ns, head_sha256, rows_done) "
+                                "VALUES (?, ?, ?, ?, 0)", (source, *identity))
+            return 0
+        if row[4]:
+            return None
+        if row[1] is None and row[0] == identity[0]:
+            # Interrupted before checkpoints recorded mtime and head hash: the size is all there is to compare
+            with self.db:
+                self.db.execute("UPDATE imports SET mtime_ns = ?, head_sha256 = ? WHERE source = ?",
+                                (identity[1], identity[2], source))
+            return row[3]
+        if tuple(row[:3]) != identity:
+            raise ValueError(f"{path} changed since its interrupted import ({row[3]} rows done); "
+                             "restore the original file to resume")
+        return row[3]
+
+    def import_file(self, path):
+        """Import one file from its checkpoint (adding to self.rows and self.visits)."""
+        done = self.checkpoint(path)
+        if done is None:
+            self.report(f"{path}: already imported, skipping")
+            return
+        if done:
+            self.report(f"{path}: resuming after {done:,} rows")
+
+        source = os.path.abspath(path)
+        reader = score_visits.ChunkReader(path, self.args.chunk_size, skip_rows=done,
+                                          dtype=score_visits.input_dtypes(path, self.args))
+        rows = 0
+        measurements = None
+        start = time.perf_counter()
+        try:
+            while (chunk := reader.read(self.args.chunk_size)) is not None:
+                if measurements is None:
+                    measurements = score_visits.select_measurements(self.store.engine, chunk.columns, self.args)
+                # The chunk and the checkpoint commit together, so a rerun never imports rows twice
+                with self.db:
+                    self.db.execute('BEGIN IMMEDIATE')
+                    visits, new_ids = self._write_chunk(chunk, measurements)
+                    self.db.execute("UPDATE imports SET rows_done = ? WHERE source = ?",
+                                    (done + rows + len(chunk), source))
+                self.patient_ids.update(new_ids)
+                rows += len(chunk)
+                self.rows += len(chunk)
+                self.visits += visits
+                elapsed = time.perf_counter() - start
+                self.report(f"{path}: {done + rows:,} rows ({rows / elapsed:,.0f} rows/s)")
+        finally:
+            reader.close()
+        with self.db:
+            self.db.execute("UPDATE imports SET completed = 1 WHERE source = ?", (source,))
+
+    def _write_chunk(self, chunk, measurements):
+        """Score and insert one chunk (inside the caller's write transaction).
+
+        Returns the visits written and {patient key: id} of the patients it
+        added, for the caller to remember once the transaction commits.
+        """
+        args = self.args
+        sex, age, results = score_visits.chunk_scores(self.store.engine, chunk, args, measurements)
+        keys = chunk[args.patient_col]
+        keep = (sex != '') & ~np.isnan(age) & keys.notna().to_numpy()
+        if not keep.any():
+            return 0, {}
+        sex, age = sex[keep], age[keep]
+        results = {indicator: (z[keep], percentile[keep]) for indicator, (z, percentile) in results.items()}
+
+        # Patient ids: one dict lookup per distinct key; new patients take the sex of their first visit
+        # (a patient the app created meanwhile is kept) and get their ids from SQLite
+        codes, unique_keys = pd.factorize(patient_keys(keys)[keep])
+        first_rows = np.unique(codes, return_index=True)[1]
+        new_patients = [(key, sex[first_rows[code]]) for code, key in enumerate(unique_keys)
+                        if key not in self.patient_ids]
+        new_ids = {}
+        if new_patients:
+            self.db.executemany(
+                "INSERT INTO patients (patient_key, sex) VALUES (?, ?) ON CONFLICT (patient_key) DO NOTHING",
+                new_patients)
+            new_keys = [key for key, _ in new_patients]
+            for start in range(0, len(new_keys), KEY_BATCH):
+                batch = new_keys[start:start + KEY_BATCH]
+                new_ids.update(self.db.execute(
+                    f"SELECT patient_key, id FROM patients WHERE patient_key IN ({','.join('?' * len(batch))})", batch))
+        unique_ids = np.array([self.patient_ids.get(key) or new_ids[key] for key in unique_keys], dtype=np.int64)
+
+        # Nothing else can write while this transaction holds the write lock, so ids from the current maximum are free
+        first_visit_id = self.db.execute("SELECT coalesce(max(id), 0) FROM visits").fetchone()[0] + 1
+        visit_ids = np.arange(first_visit_id, first_visit_id + len(age))
+        position = (chunk[args.position_col].where(chunk[args.position_col].notna(), None).to_numpy(dtype=object)[keep]
+                    if args.position_col in chunk.columns else [None] * len(age))
+        self.db.executemany(
+            "INSERT INTO visits (id, patient_id, visit_date, age_months, position) VALUES (?, ?, ?, ?, ?)",
+            zip(visit_ids.tolist(), unique_ids[codes].tolist(), visit_dates(chunk, args)[keep].tolist(),
+                age.tolist(), list(position)))
+
+        values = {measurement_type: pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=float)[keep]
+                  for measurement_type, column in measurements.items()}
+        self.db.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?)",
+                            patient_store.measurement_rows(
+                                visit_ids, results, patient_store.indicator_values(results, **values)))
+        return len(age), new_ids
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Bulk import historical visits into the patient store.")
+    parser.add_argument('inputs', nargs='+', help="Visit files (.csv or .parquet)")
+    parser.add_argument('--db', default=patient_store.DB_FILE, help="Patient store database (default: patients.db)")
+    parser.add_argument('--patient-col', default='patient_id', help="Patient identifier (the store's patient key)")
+    parser.add_argument('--chunk-size', type=int, default=250_000,
+                        help="Rows per chunk, scored and committed together (default: 250000)")
+    score_visits.add_column_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    missing = [path for path in args.inputs if not os.path.exists(path)]
+    if missing:
+        print(f"Input file not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    store = patient_store.PatientStore(args.db)
+    importer = VisitImporter(store, args)
+    start = time.perf_counter()
+    status = 0
+    try:
+        pending = [path for path in args.inputs if importer.checkpoint(path) is not None]
+    except ValueError as e:
+        print(e, file=sys.stderr)
+        store.close()
+        return 1
+
+    try:
+        for path in args.inputs:
+            importer.import_file(path)
+    except KeyboardInterrupt:
+        print("Interrupted; run the same command again to resume", file=sys.stderr)
+        status = 130
+    finally:
+        if pending:
+            store.db.execute('PRAGMA optimize')
+        elapsed = time.perf_counter() - start
+        rate = importer.rows / elapsed if elapsed > 0 else float('inf')
+        print(f"Imported {importer.visits:,} visits from {importer.rows:,} rows in {elapsed:.1f}s "
+              f"({rate:,.0f} rows/s) -> {args.db}", file=sys.stderr)
+        store.close()
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,410 @@
+# Vectorized LMS z-score / percentile engine for the WHO growth standards
+import glob
+import os
+import re
+
+import numpy as np
+
+# Average days per month used by the WHO standards (365.25 / 12)
+DAYS_PER_MONTH = 30.4375
+
+# Age (months) where the WHO standard switches from recumbent length to
+# standing height, and the average difference between the two (cm)
+SEAM_AGE = 24
+LENGTH_HEIGHT_OFFSET = 0.7
+
+# Folder holding the WHO tab_*.csv reference tables (next to the app)
+DATA_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# WHO file name codes -> (measurement type used throughout the app, x-variable)
+INDICATOR_CODES = {
+    'lhfa': ('height', 'age'),
+    'wfa': ('weight', 'age'),
+    'bmi': ('bmi', 'age'),
+    'hcfa': ('head', 'age'),
+    'wfl': ('weight', 'length'),
+    'wfh': ('weight', 'height'),
+}
+
+# x-variable -> the column holding it in the WHO tables (age in months, length/height in cm)
+X_COLUMNS = {
+    'age': 'Month',
+    'length': 'Length',
+    'height': 'Height',
+}
+
+# WHO file name sex codes -> gender labels used in the app
+SEX_CODES = {
+    'boys': 'Boy',
+    'girls': 'Girl',
+}
+
+# Accepted spellings of sex in visit extracts and requests -> gender labels used by the engine
+SEX_VALUES = {
+    'boy': 'Boy', 'm': 'Boy', 'male': 'Boy', '1': 'Boy',
+    'girl': 'Girl', 'f': 'Girl', 'female': 'Girl', '2': 'Girl',
+}
+
+# Percentile cut points used for the growth assessment labels
+PERCENTILE_CUTS = [3, 15, 50, 85, 97]
+PERCENTILE_LABELS = [
+    "Below 3rd percentile",
+    "Between 3rd-15th percentile",
+    "Between 15th-50th percentile",
+    "Between 50th-85th percentile",
+    "Between 85th-97th percentile",
+    "Above 97th percentile",
+]
+
+# Indicator (GrowthEngine.score_visits keys) -> name in assessment labels;
+# weight-for-length is named weight-for-height from the 24-month seam
+INDICATOR_NAMES = {
+    'height': 'height',
+    'weight': 'weight',
+    'head': 'head circumference',
+    'bmi': 'BMI-for-age',
+    'weight_for_length': 'weight-for-length',
+}
+WEIGHT_FOR_HEIGHT_NAME = 'weight-for-height'
+
+TABLE_FILE_PATTERN = re.compile(r'^tab_([a-z]+)_([a-z]+)_p_(\d+)_(\d+)\.csv$')
+
+
+def lms_value(z, L, M, S):
+    """Measurement value at z-score z for the given LMS parameters (all inputs broadcast).
+
+    The inverse of lms_zscore within +/-3 SD, e.g. for drawing centile or SD lines.
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(
+            L == 0,
+            M * np.exp(S * z),
+            M * np.power(1 + L * S * z, 1 / np.where(L == 0, 1, L))
+        )
+
+
+def lms_zscore(measurement, L, M, S):
+    """Compute z-scores from LMS parameters (all inputs broadcast)."""
+    y = np.asarray(measurement, dtype=float)
+    L = np.asarray(L, dtype=float)
+    M = np.asarray(M, dtype=float)
+    S = np.asarray(S, dtype=float)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        z = np.where(
+            L == 0,
+            np.log(y / M) / S,
+            (np.power(y / M, L) - 1) / (np.where(L == 0, 1, L) * S)
+        )
+
+        # WHO restricted application of the LMS method: beyond +/-3 SD the
+        # distance between SD2 and SD3 is used as a fixed unit (no-op for L=1)
+        sd2_pos = lms_value(2, L, M, S)
+        sd3_pos = lms_value(3, L, M, S)
+        sd2_neg = lms_value(-2, L, M, S)
+        sd3_neg = lms_value(-3, L, M, S)
+        z = np.where(z > 3, 3 + (y - sd3_pos) / (sd3_pos - sd2_pos), z)
+        z = np.where(z < -3, -3 + (y - sd3_neg) / (sd2_neg - sd3_neg), z)
+
+    return z
+
+
+def days_to_months(age_days):
+    """Convert ages in days to (fractional) months."""
+    return np.asarray(age_days, dtype=float) / DAYS_PER_MONTH
+
+
+def _erf(x):
+    """Vectorized error function (Abramowitz & Stegun 7.1.26, |error| < 1.5e-7)."""
+    sign = np.sign(x)
+    x = np.abs(x)
+    t = 1.0 / (1.0 + 0.3275911 * x)
+    poly = t * (0.254829592 + t * (-0.284496736 + t * (1.421413741 + t * (-1.453152027 + t * 1.061405429))))
+    return sign * (1.0 - poly * np.exp(-x * x))
+
+
+def zscore_to_percentile(z):
+    """Convert z-scores to percentiles (0-100) of the standard normal."""
+    z = np.asarray(z, dtype=float)
+    return 50.0 * (1.0 + _erf(z / np.sqrt(2.0)))
+
+
+def percentile_labels(percentile, measurement_type):
+    """Growth assessment label for each percentile, e.g. 'Below 3rd percentile (height)'."""
+    percentile = np.asarray(percentile, dtype=float)
+    labels = np.array([f"{label} ({measurement_type})" for label in PERCENTILE_LABELS] +
+                      [f"No data available for {measurement_type}"])
+    band = np.searchsorted(PERCENTILE_CUTS, percentile, side='right')
+    band = np.where(np.isnan(percentile), len(PERCENTILE_LABELS), band)
+    return labels[band]
+
+
+def indicator_name(indicator, age=None):
+    """Name of an indicator in assessment labels at one age, e.g. 'head' -> 'head circumference'."""
+    if indicator == 'weight_for_length' and age is not None and age >= SEAM_AGE:
+        return WEIGHT_FOR_HEIGHT_NAME
+    return INDICATOR_NAMES.get(indicator, indicator)
+
+
+def indicator_labels(percentile, indicator, age):
+    """percentile_labels for arrays of visits of one indicator, named by indicator_name at each age."""
+    labels = percentile_labels(percentile, indicator_name(indicator))
+    if indicator == 'weight_for_length':
+        labels = np.where(np.asarray(age, dtype=float) < SEAM_AGE, labels,
+                          percentile_labels(percentile, WEIGHT_FOR_HEIGHT_NAME))
+    return labels
+
+
+class LMSTable:
+    """WHO LMS reference table: L, M, S by age in months.
+
+    L, M and S are linearly interpolated between tabulated ages, so any
+    fractional age (e.g. converted from days) gets its own parameters.
+    Weight-for-length/height tables use the same class with length or
+    height (cm) in place of age.
+    """
+
+    def __init__(self, ages, L, M, S):
+        self.ages = np.asarray(ages, dtype=float)
+        self.L = np.asarray(L, dtype=float)
+        self.M = np.asarray(M, dtype=float)
+        self.S = np.asarray(S, dtype=float)
+        self._build_index([self])
+
+    @classmethod
+    def spanning(cls, bands):
+        """One continuous table over consecutive age bands (e.g. 0-2 and 2-5 years).
+
+        Where two bands share a boundary age (the 24-month seam between
+        recumbent length and standing height) the later band applies from
+        that age on, while ages just below it still interpolate towards the
+        earlier band's own value at the boundary.
+        """
+        bands = sorted(bands, key=lambda t: t.min_age)
+        table = cls.__new__(cls)
+        keep = [band.ages < next_band.min_age for band, next_band in zip(bands, bands[1:])]
+        keep.append(np.ones(len(bands[-1].ages), dtype=bool))
+        table.ages = np.concatenate([band.ages[k] for band, k in zip(bands, keep)])
+        table.L = np.concatenate([band.L[k] for band, k in zip(bands, keep)])
+        table.M = np.concatenate([band.M[k] for band, k in zip(bands, keep)])
+        table.S = np.concatenate([band.S[k] for band, k in zip(bands, keep)])
+        table._build_index(bands)
+        return table
+
+    def _build_index(self, bands):
+        """Precompute per-interval start values and slopes for every band.
+
+        A lookup is then a bucket index plus one multiply-add; interval
+        slopes never cross from one band into the next.
+        """
+        x0, L0, M0, S0, dL, dM, dS = [], [], [], [], [], [], []
+        for i, band in enumerate(bands):
+            steps = np.diff(band.ages)
+            n = len(steps)
+            if i + 1 < len(bands):
+                n = int(np.count_nonzero(band.ages[:-1] < bands[i + 1].min_age))
+            x0.append(band.ages[:n])
+            L0.append(band.L[:n])
+            M0.append(band.M[:n])
+            S0.append(band.S[:n])
+            with np.errstate(divide='ignore', invalid='ignore'):
+                dL.append(np.diff(band.L)[:n] / steps[:n])
+                dM.append(np.diff(band.M)[:n] / steps[:n])
+                dS.append(np.diff(band.S)[:n] / steps[:n])
+
+        self._x0 = np.concatenate(x0)
+        self._L0, self._M0, self._S0 = np.concatenate(L0), np.concatenate(M0), np.concatenate(S0)
+        self._dL, self._dM, self._dS = np.concatenate(dL), np.concatenate(dM), np.concatenate(dS)
+
+        steps = np.diff(self._x0)
+        self.step = steps[0] if len(steps) else 1.0
+        # Evenly spaced ages (all WHO tables) allow O(1) bucketing instead of a search
+        self.uniform = bool(len(steps)) and np.allclose(steps, self.step)
+
+    @classmethod
+    def from_csv(cls, path, x_variable='age'):
+        """Load the Month (or Length/Height), L, M, S columns of a WHO tab_*.csv file."""
+        table = np.genfromtxt(path, delimiter=',', names=True)
+        return cls(table[X_COLUMNS[x_variable]], table['L'], table['M'], table['S'])
+
+    @property
+    def min_age(self):
+        return self.ages[0]
+
+    @property
+    def max_age(self):
+        return self.ages[-1]
+
+    def buckets(self, age):
+        """Index of the tabulated interval holding each age."""
+        age = np.asarray(age, dtype=float)
+        last = len(self._x0) - 1
+        if self.uniform:
+            with np.errstate(invalid='ignore'):
+                position = np.floor((age - self._x0[0]) / self.step)
+            bucket = np.clip(np.nan_to_num(position), 0, last).astype(np.intp)
+        else:
+            bucket = np.clip(np.searchsorted(self._x0, age, side='right') - 1, 0, last)
+        return bucket
+
+    def lms(self, age):
+        """L, M, S arrays for each age, interpolated between tabulated ages."""
+        age = np.asarray(age, dtype=float)
+        bucket = self.buckets(age)
+        offset = age - self._x0[bucket]
+        return (
+            self._L0[bucket] + self._dL[bucket] * offset,
+            self._M0[bucket] + self._dM[bucket] * offset,
+            self._S0[bucket] + self._dS[bucket] * offset,
+        )
+
+    def zscores(self, age, measurement):
+        """Z-scores of measurements taken at the given ages."""
+        L, M, S = self.lms(age)
+        return lms_zscore(measurement, L, M, S)
+
+
+def adjust_for_position(age, height, position):
+    """Convert length/height to the measurement the WHO table expects at each age.
+
+    Below 24 months the standard uses recumbent length, from 24 months
+    standing height; the two differ by 0.7 cm. position holds 'recumbent'
+    ('L') or 'standing' ('H') per child, anything else is left unchanged.
+    """
+    position = np.char.lower(np.asarray(position, dtype=str))
+    recumbent = np.isin(position, ['recumbent', 'l', 'length'])
+    standing = np.isin(position, ['standing', 'h', 'height'])
+    adjustment = np.where(standing & (age < SEAM_AGE), LENGTH_HEIGHT_OFFSET, 0.0)
+    adjustment = np.where(recumbent & (age >= SEAM_AGE), -LENGTH_HEIGHT_OFFSET, adjustment)
+    return height + adjustment
+
+
+class GrowthEngine:
+    """Scores arrays of (sex, age, measurement) against the WHO LMS tables.
+
+    Tables are keyed by (sex, measurement type, x-variable), where the
+    x-variable is age or, for weight-for-length/height, length or height.
+    Each key gets one continuous reference built from its band tables
+    (e.g. 0-2 years recumbent length and 2-5 years standing height for
+    height-for-age), so a series crossing 24 months is scored in one pass.
+    """
+
+    def __init__(self, tables=None):
+        self.bands = {}
+        self.tables = {}
+        for (sex, measurement_type, x_variable), bands in (tables or {}).items():
+            for table in bands:
+                self.add_table(sex, measurement_type, table, x_variable)
+
+    def add_table(self, sex, measurement_type, table, x_variable='age'):
+        """Register a band table and rebuild the continuous reference."""
+        key = (sex, measurement_type, x_variable)
+        bands = self.bands.setdefault(key, [])
+        bands.append(table)
+        self.tables[key] = LMSTable.spanning(bands) if len(bands) > 1 else table
+
+    def has_indicator(self, sex, measurement_type, x_variable='age'):
+        return (sex, measurement_type, x_variable) in self.tables
+
+    @property
+    def measurement_types(self):
+        """Measurement types with at least one age-based table."""
+        return {t for _, t, x in self.tables if x == 'age'}
+
+    def _zscores(self, sex, x, measurement, measurement_type, x_variable):
+        """Z-scores against the tables of one (measurement type, x-variable); NaN outside their range."""
+        x, measurement = np.broadcast_arrays(np.atleast_1d(np.asarray(x, dtype=float)),
+                                             np.atleast_1d(np.asarray(measurement, dtype=float)))
+        sex = np.broadcast_to(np.asarray(sex), x.shape)
+        z = np.full(x.shape, np.nan)
+        for (table_sex, table_type, table_x), table in self.tables.items():
+            if table_type != measurement_type or table_x != x_variable:
+                continue
+            mask = (sex == table_sex) & (x >= table.min_age) & (x <= table.max_age)
+            if mask.any():
+                z[mask] = table.zscores(x[mask], measurement[mask])
+        return z
+
+    def zscores(self, sex, age, measurement, measurement_type="height", position=None):
+        """Z-scores for arrays of sex ('Boy'/'Girl'), age (months, may be fractional) and measurement.
+
+        For height, position ('recumbent'/'standing' per child) applies the
+        0.7 cm length/height correction around the 24-month seam.
+        """
+        age = np.atleast_1d(np.asarray(age, dtype=float))
+        measurement = np.atleast_1d(np.asarray(measurement, dtype=float))
+        age, measurement = np.broadcast_arrays(age, measurement)
+        if position is not None and measurement_type == "height":
+            measurement = adjust_for_position(age, measurement, np.broadcast_to(position, age.shape))
+        # Ages outside the reference range stay NaN
+        return self._zscores(sex, age, measurement, measurement_type, 'age')
+
+    def weight_for_length_zscores(self, sex, age, height, weight, position=None):
+        """Weight-for-length (under 24 months) or weight-for-height (from 24 months) z-scores."""
+        age, height, weight = np.broadcast_arrays(*(np.atleast_1d(np.asarray(a, dtype=float))
+                                                    for a in (age, height, weight)))
+        sex = np.broadcast_to(np.asarray(sex), age.shape)
+        if position is not None:
+            height = adjust_for_position(age, height, np.broadcast_to(position, age.shape))
+        z = np.full(age.shape, np.nan)
+        for x_variable, mask in (('length', age < SEAM_AGE), ('height', age >= SEAM_AGE)):
+            if mask.any():
+                z[mask] = self._zscores(sex[mask], height[mask], weight[mask], 'weight', x_variable)
+        return z
+
+    def score_visits(self, sex, age, height=None, weight=None, head=None, position=None):
+        """Every indicator the given measurements allow, for arrays of visits in one call.
+
+        Returns {indicator: (z-scores, percentiles)} for length/height-for-age
+        ('height'), weight-for-age ('weight'), head circumference-for-age
+        ('head'), BMI-for-age ('bmi') and weight-for-length/height
+        ('weight_for_length'). Indicators whose measurements are not given
+        are left out; missing values within an array score as NaN.
+        """
+        age = np.atleast_1d(np.asarray(age, dtype=float))
+        sex = np.broadcast_to(np.asarray(sex), age.shape)
+        given = {m: np.broadcast_to(np.asarray(v, dtype=float), age.shape)
+                 for m, v in (('height', height), ('weight', weight), ('head', head)) if v is not None}
+        # Correct length/height once; BMI and weight-for-length use the corrected value too
+        if 'height' in given and position is not None:
+            given['height'] = adjust_for_position(age, given['height'], np.broadcast_to(position, age.shape))
+
+        z = {m: self._zscores(sex, age, values, m, 'age') for m, values in given.items()}
+        if 'height' in given and 'weight' in given:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                bmi = given['weight'] / (given['height'] / 100) ** 2
+            z['bmi'] = self._zscores(sex, age, bmi, 'bmi', 'age')
+            z['weight_for_length'] = self.weight_for_length_zscores(sex, age, given['height'], given['weight'])
+        return {indicator: (values, zscore_to_percentile(values)) for indicator, values in z.items()}
+
+    def score(self, sex, age, measurement, measurement_type="height", position=None):
+        """Return (z-scores, percentiles) for arrays of sex, age and measurement."""
+        z = self.zscores(sex, age, measurement, measurement_type, position)
+        return z, zscore_to_percentile(z)
+
+    def percentile_status(self, sex, age, measurement, measurement_type="height", position=None):
+        """Growth assessment labels (same wording as get_percentile_status)."""
+        _, percentile = self.score(sex, age, measurement, measurement_type, position)
+        return percentile_labels(percentile, measurement_type)
+
+
+def table_key(file_name):
+    """(sex, measurement type, x-variable) scored from a WHO table file, or None for other files."""
+    match = TABLE_FILE_PATTERN.match(file_name)
+    if not match:
+        return None
+    code, sex_code, _, _ = match.groups()
+    if code not in INDICATOR_CODES or sex_code not in SEX_CODES:
+        return None
+    return (SEX_CODES[sex_code],) + INDICATOR_CODES[code]
+
+
+def load_engine(data_dir=DATA_DIR):
+    """Build a GrowthEngine from every WHO tab_*_p_*.csv table in data_dir."""
+    engine = GrowthEngine()
+    for path in sorted(glob.glob(os.path.join(data_dir, 'tab_*.csv'))):
+        key = table_key(os.path.basename(path))
+        if key is not None:
+            sex, measurement_type, x_variable = key
+            engine.add_table(sex, measurement_type, LMSTable.from_csv(path, x_variable), x_variable)
+    return engine
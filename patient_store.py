@@ -0,0 +1,201 @@
+# Local patient store: patients, visits, measurements (with z-scores) and clinical notes in SQLite
+#
+# Visits are scored with the LMS engine when they are written, so a child's
+# chart history is read back with a single indexed query and no scoring:
+# visits are indexed by (patient, visit date) and measurements are stored
+# clustered by visit (WITHOUT ROWID primary key), one row per indicator.
+#
+#   store = PatientStore()
+#   store.save_visit('MRN-1042', 'Girl', 18, height=81.2, weight=10.9, note="Well child check")
+#   store.history('MRN-1042')   # -> [{'visit_date': ..., 'height': 81.2, 'height_z': ..., ...}, ...]
+import datetime
+import os
+import sqlite3
+import threading
+
+import numpy as np
+
+import refcache
+
+DB_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'patients.db')
+
+# Seconds a connection waits for another one's write (e.g. a chunk of a running bulk import)
+BUSY_TIMEOUT = 60
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS patients (
+    id INTEGER PRIMARY KEY,
+    patient_key TEXT NOT NULL UNIQUE,
+    name TEXT,
+    sex TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS visits (
+    id INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL REFERENCES patients(id),
+    visit_date TEXT NOT NULL,
+    age_months REAL NOT NULL,
+    position TEXT
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    visit_id INTEGER NOT NULL REFERENCES visits(id),
+    indicator TEXT NOT NULL,
+    value REAL,
+    z REAL,
+    percentile REAL,
+    PRIMARY KEY (visit_id, indicator)
+) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS notes (
+    id INTEGER PRIMARY KEY,
+    patient_id INTEGER NOT NULL REFERENCES patients(id),
+    visit_id INTEGER REFERENCES visits(id),
+    created_at TEXT NOT NULL,
+    text TEXT NOT NULL
+);
+"""
+
+# Secondary indexes (history() looks visits up by patient and date)
+INDEXES = """
+CREATE INDEX IF NOT EXISTS visits_patient_date ON visits (patient_id, visit_date);
+CREATE INDEX IF NOT EXISTS notes_patient ON notes (patient_id, created_at);
+"""
+
+HISTORY_QUERY = """
+SELECT v.id, v.visit_date, v.age_months, v.position, m.indicator, m.value, m.z, m.percentile
+FROM visits v JOIN measurements m ON m.visit_id = v.id
+WHERE v.patient_id = (SELECT id FROM patients WHERE patient_key = ?)
+ORDER BY v.visit_date, v.id
+"""
+
+
+def indicator_values(results, height=None, weight=None, head=None):
+    """Stored value per scored indicator: the measurement itself, or BMI (kg/m²) for bmi."""
+    values = {'height': height, 'weight': weight, 'head': head, 'weight_for_length': weight}
+    if 'bmi' in results:
+        with np.errstate(divide='ignore', invalid='ignore'):
+            values['bmi'] = np.asarray(weight, dtype=float) / (np.asarray(height, dtype=float) / 100) ** 2
+    return {indicator: np.broadcast_to(np.asarray(values[indicator], dtype=float), results[indicator][0].shape)
+            for indicator in results}
+
+
+def measurement_rows(visit_ids, results, values):
+    """(visit_id, indicator, value, z, percentile) rows for the measurements table.
+
+    Visits without a value for an indicator get no row; unscorable z-scores (NaN) are stored as NULL.
+    """
+    visit_ids = np.asarray(visit_ids)
+    rows = []
+    for indicator, (z, percentile) in results.items():
+        measured = ~np.isnan(values[indicator])
+        rows.extend(zip(visit_ids[measured].tolist(), [indicator] * int(measured.sum()),
+                        values[indicator][measured].tolist(), z[measured].tolist(), percentile[measured].tolist()))
+    return rows
+
+
+class PatientStore:
+    """SQLite-backed patients, scored visits and notes.
+
+    One connection is shared by the threads of the app (Streamlit sessions)
+    behind a lock; WAL mode lets other processes read while it writes.
+    """
+
+    def __init__(self, path=DB_FILE, engine=None):
+        self.path = path
+        self.engine = engine or refcache.load_engine()
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.execute('PRAGMA foreign_keys=ON')
+        self.db.executescript(SCHEMA + INDEXES)
+
+    def close(self):
+        self.db.close()
+
+    def _patient_id(self, patient_key, sex, name=None):
+        # Create the patient or update its name/sex; called inside a transaction
+        self.db.execute(
+            "INSERT INTO patients (patient_key, name, sex) VALUES (?, ?, ?) "
+            "ON CONFLICT (patient_key) DO UPDATE SET name = coalesce(excluded.name, name), sex = excluded.sex",
+            (patient_key, name, sex))
+        return self.db.execute("SELECT id FROM patients WHERE patient_key = ?", (patient_key,)).fetchone()[0]
+
+    def patient(self, patient_key):
+        """{'patient_key', 'name', 'sex', 'visits'} of a stored patient, or None."""
+        with self.lock:
+            row = self.db.execute(
+                "SELECT p.patient_key, p.name, p.sex, (SELECT count(*) FROM visits WHERE patient_id = p.id) "
+                "FROM patients p WHERE p.patient_key = ?", (patient_key,)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('patient_key', 'name', 'sex', 'visits'), row))
+
+    def save_visit(self, patient_key, sex, age_months, height=None, weight=None, head=None, position=None,
+                   visit_date=None, name=None, note=None):
+        """Score and store one visit (and an optional note); returns the visit id.
+
+        The patient is created on first save; visit_date defaults to today.
+        """
+        results = self.engine.score_visits(sex, age_months, height, weight, head, position)
+        values = indicator_values(results, height, weight, head)
+        visit_date = str(visit_date or datetime.date.today().isoformat())
+        with self.lock, self.db:
+            patient_id = self._patient_id(patient_key, sex, name)
+            visit_id = self.db.execute(
+                "INSERT INTO visits (patient_id, visit_date, age_months, position) VALUES (?, ?, ?, ?)",
+                (patient_id, visit_date, float(age_months), position)).lastrowid
+            self.db.executemany("INSERT INTO measurements VALUES (?, ?, ?, ?, ?)",
+                                measurement_rows([visit_id], results, values))
+            if note:
+                self._insert_note(patient_id, note, visit_id)
+        return visit_id
+
+    def _insert_note(self, patient_id, text, visit_id=None):
+        created_at = datetime.datetime.now().isoformat(timespec='seconds')
+        self.db.execute("INSERT INTO notes (patient_id, visit_id, created_at, text) VALUES (?, ?, ?, ?)",
+                        (patient_id, visit_id, created_at, text))
+
+    def add_note(self, patient_key, text):
+        """Store a clinical note for an existing patient."""
+        with self.lock, self.db:
+            row = self.db.execute("SELECT id FROM patients WHERE patient_key = ?", (patient_key,)).fetchone()
+            if row is None:
+                raise KeyError(f"Unknown patient: {patient_key}")
+            self._insert_note(row[0], text)
+
+    def history(self, patient_key):
+        """Every visit of a patient in date order, with each indicator's value, z-score and percentile.
+
+        One indexed query: [{'visit_id', 'visit_date', 'age_months', 'position',
+        '<indicator>', '<indicator>_z', '<indicator>_percentile', ...}, ...]
+        (NaN z-scores come back as None).
+        """
+        with self.lock:
+            rows = self.db.execute(HISTORY_QUERY, (patient_key,)).fetchall()
+        visits = {}
+        for visit_id, visit_date, age, position, indicator, value, z, percentile in rows:
+            visit = visits.get(visit_id)
+            if visit is None:
+                visit = visits[visit_id] = {'visit_id': visit_id, 'visit_date': visit_date,
+                                            'age_months': age, 'position': position}
+            visit[indicator] = value
+            visit[f'{indicator}_z'] = z
+            visit[f'{indicator}_percentile'] = percentile
+        return list(visits.values())
+
+    def cohort(self, sex, indicator, min_age, max_age):
+        """(ages, values) arrays of every stored visit of one sex in an age range with a value for indicator."""
+        with self.lock:
+            rows = self.db.execute(
+                "SELECT v.age_months, m.value FROM visits v "
+                "JOIN patients p ON p.id = v.patient_id "
+                "JOIN measurements m ON m.visit_id = v.id AND m.indicator = ? "
+                "WHERE p.sex = ? AND v.age_months BETWEEN ? AND ?", (indicator, sex, min_age, max_age)).fetchall()
+        columns = np.array(rows, dtype=float).reshape(-1, 2)
+        return columns[:, 0], columns[:, 1]
+
+    def notes(self, patient_key):
+        """(created_at, text) of a patient's notes, newest first."""
+        with self.lock:
+            return self.db.execute(
+                "SELECT n.created_at, n.text FROM notes n JOIN patients p ON p.id = n.patient_id "
+                "WHERE p.patient_key = ? ORDER BY n.created_at DESC, n.id DESC", (patient_key,)).fetchall()
@@ -0,0 +1,201 @@
+# Compiled binary cache of the WHO reference tables
+#
+# All tab_*.csv tables are compiled once into a single versioned file that
+# every worker memory-maps read-only at startup, instead of re-parsing the
+# CSVs in each process.
+#
+# Build (or rebuild after changing any CSV):
+#   python refcache.py build
+#   python refcache.py check
+#
+# File layout:
+#   MAGIC (8 bytes) | header length (uint32 LE) | JSON header | padding | float64 payload
+# Each table is stored column-major so every column is a contiguous view.
+import functools
+import glob
+import hashlib
+import json
+import os
+import struct
+import sys
+import warnings
+
+import numpy as np
+
+import lms
+
+MAGIC = b'GROWREF\x00'
+FORMAT_VERSION = 1
+ALIGNMENT = 64
+CACHE_FILE = os.path.join(lms.DATA_DIR, 'reference_tables.bin')
+
+
+def _source_files(data_dir):
+    return sorted(glob.glob(os.path.join(data_dir, 'tab_*.csv')))
+
+
+def source_fingerprint(data_dir=lms.DATA_DIR):
+    """SHA-256 over the names and contents of every source CSV."""
+    digest = hashlib.sha256()
+    for path in _source_files(data_dir):
+        digest.update(os.path.basename(path).encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_cache(path=CACHE_FILE, data_dir=lms.DATA_DIR):
+    """Compile every tab_*.csv in data_dir into one binary cache file."""
+    tables = {}
+    blocks = []
+    offset = 0
+    for csv_path in _source_files(data_dir):
+        name = os.path.splitext(os.path.basename(csv_path))[0]
+        data = np.genfromtxt(csv_path, delimiter=',', names=True)
+        columns = list(data.dtype.names)
+        block = np.vstack([data[column].astype('<f8') for column in columns])
+        tables[name] = {'columns': columns, 'rows': block.shape[1], 'offset': offset}
+        blocks.append(block.ravel())
+        offset += block.size
+
+    payload = np.concatenate(blocks) if blocks else np.empty(0, dtype='<f8')
+    header = {
+        'format_version': FORMAT_VERSION,
+        'source_sha256': source_fingerprint(data_dir),
+        'payload_sha256': hashlib.sha256(payload.tobytes()).hexdigest(),
+        'tables': tables,
+    }
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    data_offset = len(MAGIC) + 4 + len(header_bytes)
+    padding = (-data_offset) % ALIGNMENT
+
+    # Write to a temporary file and rename so running workers never map a partial file
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(MAGIC)
+        f.write(struct.pack('<I', len(header_bytes)))
+        f.write(header_bytes)
+        f.write(b'\x00' * padding)
+        f.write(payload.tobytes())
+    os.replace(tmp_path, path)
+    return header
+
+
+class ReferenceCache:
+    """Read-only, memory-mapped view of a compiled reference cache file."""
+
+    def __init__(self, path=CACHE_FILE, verify=True):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"{path} is not a reference table cache")
+            (header_length,) = struct.unpack('<I', f.read(4))
+            self.header = json.loads(f.read(header_length))
+
+        if self.header['format_version'] != FORMAT_VERSION:
+            raise ValueError(f"{path} has format version {self.header['format_version']}, "
+                             f"expected {FORMAT_VERSION}; rebuild with 'python refcache.py build'")
+
+        data_offset = len(MAGIC) + 4 + header_length
+        data_offset += (-data_offset) % ALIGNMENT
+        size = sum(len(t['columns']) * t['rows'] for t in self.header['tables'].values())
+        self.path = path
+        self.payload = np.memmap(path, dtype='<f8', mode='r', offset=data_offset, shape=(size,))
+
+        if verify and hashlib.sha256(self.payload).hexdigest() != self.header['payload_sha256']:
+            raise ValueError(f"{path} failed its checksum; rebuild with 'python refcache.py build'")
+
+    @property
+    def table_names(self):
+        return list(self.header['tables'])
+
+    def has_table(self, name):
+        return name in self.header['tables']
+
+    def table(self, name):
+        """Columns of one table as zero-copy array views, keyed by CSV column name."""
+        meta = self.header['tables'][name]
+        rows = meta['rows']
+        block = self.payload[meta['offset']:meta['offset'] + rows * len(meta['columns'])]
+        block = np.asarray(block).reshape(len(meta['columns']), rows)
+        return dict(zip(meta['columns'], block))
+
+    def is_stale(self, data_dir=lms.DATA_DIR):
+        """True when the source CSVs changed since the cache was built."""
+        return self.header['source_sha256'] != source_fingerprint(data_dir)
+
+    def engine(self):
+        """GrowthEngine backed directly by the mapped LMS columns."""
+        engine = lms.GrowthEngine()
+        for name in self.table_names:
+            key = lms.table_key(name + '.csv')
+            if key is None:
+                continue
+            sex, measurement_type, x_variable = key
+            columns = self.table(name)
+            table = lms.LMSTable(columns[lms.X_COLUMNS[x_variable]], columns['L'], columns['M'], columns['S'])
+            engine.add_table(sex, measurement_type, table, x_variable)
+        return engine
+
+
+@functools.lru_cache(maxsize=None)
+def open_cache(path=CACHE_FILE):
+    """The process-wide mapped cache, or None if it is missing, unreadable or out of date."""
+    if not os.path.exists(path):
+        return None
+    try:
+        cache = ReferenceCache(path)
+    except ValueError as e:
+        # Another format version or a failed checksum: the CSVs still work
+        warnings.warn(f"{e}; using the CSV tables")
+        return None
+    # The CSVs are small (hashing them takes about half a millisecond), so a value edited in place is caught too
+    if cache.is_stale(os.path.dirname(path)):
+        warnings.warn(f"{path} does not match the CSV tables; ignoring it "
+                      f"(rebuild with 'python refcache.py build')")
+        return None
+    return cache
+
+
+def read_table(name, data_dir=lms.DATA_DIR):
+    """Columns of a reference table from the cache, falling back to its CSV (None if neither exists)."""
+    cache = open_cache()
+    if cache is not None and cache.has_table(name):
+        return cache.table(name)
+    csv_path = os.path.join(data_dir, name + '.csv')
+    if not os.path.exists(csv_path):
+        return None
+    data = np.genfromtxt(csv_path, delimiter=',', names=True)
+    return {column: data[column] for column in data.dtype.names}
+
+
+def load_engine():
+    """GrowthEngine from the compiled cache when available, otherwise from the CSVs."""
+    cache = open_cache()
+    if cache is None:
+        return lms.load_engine()
+    return cache.engine()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    command = argv[0] if argv else 'build'
+    if command == 'build':
+        header = build_cache()
+        print(f"Compiled {len(header['tables'])} tables into {CACHE_FILE}")
+        return 0
+    if command == 'check':
+        if not os.path.exists(CACHE_FILE):
+            print(f"{CACHE_FILE} not found; run 'python refcache.py build'")
+            return 1
+        cache = ReferenceCache(CACHE_FILE)
+        if cache.is_stale():
+            print(f"{CACHE_FILE} is out of date with the CSV tables; run 'python refcache.py build'")
+            return 1
+        print(f"{CACHE_FILE} is up to date ({len(cache.table_names)} tables)")
+        return 0
+    print(f"Unknown command: {command} (expected 'build' or 'check')")
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
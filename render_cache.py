@@ -0,0 +1,108 @@
+# In-memory cache of rendered pages for shared links
+#
+# Clinics send the same link to many parents, so the same parameter set is
+# rendered over and over. The cache keeps the computed page (assessment
+# strings, BMI, formatted age and chart figure dicts) per normalized set of
+# inputs, bounded in size (least recently used entries are evicted first)
+# and in age (entries expire after a time-to-live). Hits, misses, evictions
+# and expirations are counted for monitoring.
+import collections
+import threading
+import time
+
+# Entries kept, and seconds an entry stays valid
+CACHE_SIZE = 512
+CACHE_TTL = 3600
+
+
+def render_key(gender, age_range, age, height, weight, head=None, chart="Both", curve_set=None):
+    """Normalized cache key of one page's inputs.
+
+    Measurements are keyed by the exact values the page is computed from
+    ('81.2' and '81.20' in a link parse to the same float, so they share an
+    entry, while 81.24 and 81.16 do not); the patient name does not affect
+    what is computed and is not part of the key. curve_set is the
+    name of the reference line set (None for the default).
+    """
+    return (
+        gender,
+        age_range,
+        int(age),
+        float(height),
+        float(weight),
+        None if head is None else float(head),
+        chart,
+        curve_set,
+    )
+
+
+class RenderCache:
+    """Bounded LRU cache with a time-to-live and hit/miss/eviction counters.
+
+    Safe to share between the threads Streamlit runs sessions in. Values are
+    shared too, so callers must treat them as read-only.
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE, ttl=CACHE_TTL, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self.entries = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key):
+        """Cached value for key, or None on a miss (expired entries are dropped)."""
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and self.clock() - entry[0] > self.ttl:
+                del self.entries[key]
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (self.clock(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def get_or_compute(self, key, compute):
+        """Cached value for key, computing and storing it on a miss.
+
+        compute() runs outside the lock, so a slow render does not hold up
+        other sessions (two sessions missing the same key both compute it).
+        """
+        value = self.get(key)
+        if value is None:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        """Counters and current size, e.g. for a metrics endpoint or the app sidebar."""
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self.entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+            }
@@ -0,0 +1,223 @@
+# HTTP scoring service: WHO z-scores and percentiles over JSON
+#
+# Usage:
+#   python score_service.py --port 8080
+#   python score_service.py --port 8080 --workers 4
+#
+#   POST /score
+#   {"sex": "Girl", "age_months": [6, 9.5], "length": [66.1, 70.4], "weight": [7.2, 8.1]}
+#   -> {"count": 2, "height": {"z": [...], "percentile": [...]}, "weight": {...}, "bmi": {...}, ...}
+#
+# sex and position may be a single value or one per visit; length (cm),
+# weight (kg) and head_circumference (cm) are optional arrays, and every
+# indicator they allow is returned (see GrowthEngine.score_visits).
+# Missing or unscorable values come back as null.
+#
+# The reference tables are loaded once per worker (memory-mapped from the
+# compiled cache when it is built). Requests arriving within a couple of
+# milliseconds of each other are scored together in one vectorized call.
+import argparse
+import asyncio
+import contextlib
+import json
+import sys
+
+import numpy as np
+import uvicorn
+from starlette.applications import Starlette
+from starlette.responses import JSONResponse, Response
+from starlette.routing import Route
+
+import lms
+import refcache
+
+# Request fields -> GrowthEngine.score_visits measurement arguments
+MEASUREMENT_FIELDS = {
+    'length': 'height',
+    'weight': 'weight',
+    'head_circumference': 'head',
+}
+
+# Micro-batching: wait at most this long for more requests, and score at most this many visits at once
+BATCH_DELAY = 0.002
+BATCH_MAX_ROWS = 50_000
+
+# Largest number of visits accepted in one request
+MAX_REQUEST_ROWS = 100_000
+
+
+class RequestError(ValueError):
+    """A malformed /score request (reported to the client as HTTP 400)."""
+
+
+def parse_request(payload):
+    """Validate a /score body; returns (sex, age, position, {measurement: values}) arrays."""
+    if not isinstance(payload, dict):
+        raise RequestError("Request body must be a JSON object")
+    if 'age_months' not in payload:
+        raise RequestError("Missing 'age_months'")
+    try:
+        age = np.atleast_1d(np.asarray(payload['age_months'], dtype=float))
+        measurements = {m: np.atleast_1d(np.asarray(payload[field], dtype=float))
+                        for field, m in MEASUREMENT_FIELDS.items() if payload.get(field) is not None}
+    except (TypeError, ValueError):
+        raise RequestError("age_months and measurements must be numbers or arrays of numbers (null for missing)")
+    if age.ndim != 1 or len(age) > MAX_REQUEST_ROWS:
+        raise RequestError(f"age_months must be a flat array of at most {MAX_REQUEST_ROWS} values")
+    if not measurements:
+        raise RequestError(f"Give at least one of: {', '.join(MEASUREMENT_FIELDS)}")
+
+    position = payload.get('position')
+    try:
+        sex = np.atleast_1d(np.asarray(payload.get('sex', ''), dtype=str))
+        if position is not None:
+            position = np.atleast_1d(np.asarray(position, dtype=str))
+    except (TypeError, ValueError):
+        raise RequestError("sex and position must be strings or arrays of strings")
+    # Named as in the request body ('length', not the engine's 'height')
+    fields = {'sex': sex, **{field: measurements[m] for field, m in MEASUREMENT_FIELDS.items() if m in measurements}}
+    if position is not None:
+        fields['position'] = position
+    for name, values in fields.items():
+        if values.ndim != 1:
+            raise RequestError(f"'{name}' must be a single value or a flat array")
+        if len(values) not in (1, len(age)):
+            raise RequestError(f"'{name}' has {len(values)} values, expected 1 or {len(age)}")
+    sex = np.array([lms.SEX_VALUES.get(s.strip().lower(), '') for s in sex])
+
+    sex = np.broadcast_to(sex, age.shape)
+    position = np.broadcast_to(position, age.shape) if position is not None else None
+    measurements = {m: np.broadcast_to(values, age.shape) for m, values in measurements.items()}
+    return sex, age, position, measurements
+
+
+def _json_values(values):
+    """Float array as a JSON-safe list (NaN -> None)."""
+    return [None if v != v else v for v in values.tolist()]
+
+
+class ScoreBatcher:
+    """Collects concurrent requests and scores them with one engine call.
+
+    Requests with the same set of measurements (and position given or not)
+    are concatenated, scored together and split back per request.
+    """
+
+    def __init__(self, engine, delay=BATCH_DELAY, max_rows=BATCH_MAX_ROWS):
+        self.engine = engine
+        self.delay = delay
+        self.max_rows = max_rows
+        self.queue = None
+        self.task = None
+
+    def start(self):
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+
+    async def score(self, sex, age, position, measurements):
+        """{indicator: (z, percentile)} for one request, scored in the next batch."""
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((sex, age, position, measurements, future))
+        return await future
+
+    async def _run(self):
+        while True:
+            batch = [await self.queue.get()]
+            # Give concurrent requests a moment to join the batch, then take what is queued
+            await asyncio.sleep(self.delay)
+            rows = len(batch[0][1])
+            while rows < self.max_rows and not self.queue.empty():
+                item = self.queue.get_nowait()
+                batch.append(item)
+                rows += len(item[1])
+
+            groups = {}
+            for item in batch:
+                key = (tuple(sorted(item[3])), item[2] is not None)
+                groups.setdefault(key, []).append(item)
+            for items in groups.values():
+                self._score_group(items)
+
+    def _score_group(self, items):
+        try:
+            sex = np.concatenate([item[0] for item in items])
+            age = np.concatenate([item[1] for item in items])
+            position = None if items[0][2] is None else np.concatenate([item[2] for item in items])
+            measurements = {m: np.concatenate([item[3][m] for item in items]) for m in items[0][3]}
+            results = self.engine.score_visits(sex, age, position=position, **measurements)
+        except Exception as e:
+            for item in items:
+                if not item[4].done():
+                    item[4].set_exception(e)
+            return
+
+        start = 0
+        for item in items:
+            end = start + len(item[1])
+            if not item[4].done():
+                item[4].set_result({indicator: (z[start:end], percentile[start:end])
+                                    for indicator, (z, percentile) in results.items()})
+            start = end
+
+
+def create_app(engine=None):
+    """Starlette app serving POST /score and GET /health."""
+    batcher = ScoreBatcher(engine or refcache.load_engine())
+
+    async def score(request):
+        try:
+            payload = json.loads(await request.body())
+        except ValueError:
+            return JSONResponse({'error': "Request body is not valid JSON"}, status_code=400)
+        try:
+            sex, age, position, measurements = parse_request(payload)
+        except RequestError as e:
+            return JSONResponse({'error': str(e)}, status_code=400)
+
+        results = await batcher.score(sex, age, position, measurements)
+        response = {'count': len(age)}
+        for indicator, (z, percentile) in results.items():
+            response[indicator] = {'z': _json_values(z), 'percentile': _json_values(percentile)}
+        return Response(json.dumps(response), media_type='application/json')
+
+    async def health(request):
+        return JSONResponse({'status': 'ok'})
+
+    @contextlib.asynccontextmanager
+    async def lifespan(app):
+        batcher.start()
+        yield
+        batcher.stop()
+
+    app = Starlette(
+        routes=[Route('/score', score, methods=['POST']), Route('/health', health)],
+        lifespan=lifespan,
+    )
+    app.state.batcher = batcher
+    return app
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve WHO growth scoring over HTTP.")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--workers', type=int, default=1, help="Worker processes (each holds the tables)")
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.workers > 1:
+        uvicorn.run('score_service:create_app', factory=True, host=args.host, port=args.port,
+                    workers=args.workers, log_level='warning')
+    else:
+        uvicorn.run(create_app(), host=args.host, port=args.port, log_level='warning')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
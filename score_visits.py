@@ -0,0 +1,672 @@
+# Headless batch scorer: adds WHO z-scores and percentiles to a visit file
+#
+# Usage:
+#   python score_visits.py visits.csv scored.csv
+#   python score_visits.py visits.parquet scored.parquet --chunk-size 500000
+#   python score_visits.py visits.csv scored.csv --workers 8
+#   python score_visits.py visits.csv scored.csv --max-memory 512
+#   python score_visits.py visits.csv scored/ --partition
+#
+# The file is streamed: a reader thread, the scorer and a writer thread pass
+# chunks over bounded queues, so a slow writer holds back the reader and only
+# a few chunks are ever in memory. With --max-memory (MB) the chunk size is
+# derived from the measured bytes per row, and reading pauses (then shrinks
+# chunks) while the process is above the ceiling.
+#
+# With --workers the input is split into shards (byte ranges of a CSV, row
+# groups of a Parquet file) scored by a process pool. Workers memory-map the
+# compiled reference cache, so the tables sit in shared memory once instead
+# of being loaded by every process; without a built cache a temporary one is
+# compiled into /dev/shm for the run.
+#
+# Parquet output carries a growth assessment label per indicator (the
+# get_percentile_status wording). With --partition the output is a Parquet
+# dataset directory split by sex and age band (sex=Boy/age_band=0_2/...),
+# rows sorted by age into small row groups, so filters on age band, age and
+# percentile skip partitions and row groups instead of scanning everything.
+import argparse
+import io
+import multiprocessing
+import os
+import queue
+import shutil
+import sys
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+
+import lms
+import refcache
+
+# Target input bytes per shard in parallel mode
+SHARD_BYTES = 32 * 2**20
+
+# Chunks each pipeline queue may hold before the stage feeding it blocks
+QUEUE_DEPTH = 2
+
+# Under a memory ceiling: rows in the first (measuring) chunk, and the smallest chunk allowed
+PROBE_ROWS = 10_000
+MIN_CHUNK_ROWS = 1_000
+
+# Partitioned output: age bands as split by load_data() (keys as in growth_core.reference_key), and
+# rows per row group (age-sorted, so each group covers a narrow age range)
+AGE_BANDS = [('0_2', 0, 24), ('2_5', 24, 60)]
+PARTITION_ROW_GROUP_ROWS = 16_384
+
+
+def normalize_sex(sex):
+    """Map sex codes (M/F, male/female, 1/2, Boy/Girl) to 'Boy'/'Girl'."""
+    codes = pd.Series(sex).astype(str).str.strip().str.lower()
+    return codes.map(lms.SEX_VALUES).fillna('').to_numpy()
+
+
+def input_dtypes(path, args):
+    """{column: str} for every CSV column except age and the measurements (None for Parquet).
+
+    pandas infers types per chunk, so a column that is empty in the first
+    chunks would be read as numbers there and as strings later, and the
+    chunks would no longer share a schema. Only the columns scored as
+    numbers are left to inference; everything else is passed through as text.
+    """
+    if path.endswith('.parquet'):
+        return None
+    numeric = {args.age_col, args.length_col, args.weight_col, args.head_col}
+    return {column: str for column in pd.read_csv(path, nrows=0).columns if column not in numeric}
+
+
+def age_in_months(chunk, args):
+    """Age in months from the age column, or from date of birth and visit date."""
+    if args.age_col in chunk.columns:
+        return pd.to_numeric(chunk[args.age_col], errors='coerce').to_numpy(dtype=float)
+    dob = pd.to_datetime(chunk[args.dob_col], errors='coerce')
+    visit = pd.to_datetime(chunk[args.date_col], errors='coerce')
+    return lms.days_to_months((visit - dob).dt.days.to_numpy(dtype=float))
+
+
+def chunk_scores(engine, chunk, args, measurements):
+    """(sex, age in months, {indicator: (z, percentile)}) for one chunk of visits.
+
+    Length and weight also give BMI-for-age and weight-for-length/height.
+    """
+    sex = normalize_sex(chunk[args.sex_col])
+    age = age_in_months(chunk, args)
+
+    # Recumbent/standing flag, so lengths and heights either side of 24 months are corrected
+    position = None
+    if args.position_col in chunk.columns:
+        position = chunk[args.position_col].fillna('').astype(str).to_numpy()
+
+    values = {measurement_type: pd.to_numeric(chunk[column], errors='coerce').to_numpy(dtype=float)
+              for measurement_type, column in measurements.items()}
+
+    return sex, age, engine.score_visits(sex, age, position=position, **values)
+
+
+def score_chunk(engine, chunk, args, measurements):
+    """Append z-score and percentile columns for every indicator to one chunk of visits."""
+    _, age, results = chunk_scores(engine, chunk, args, measurements)
+    # The chunk belongs to the caller's pipeline, so columns are added in place rather than to a copy
+    chunk['age_months'] = age
+    for indicator, (z, percentile) in results.items():
+        chunk[f'{indicator}_z'] = z
+        chunk[f'{indicator}_percentile'] = percentile
+    return chunk
+
+
+def skip_lines(f, lines, block=2**20):
+    """Move binary file f past its next `lines` lines, reading it in blocks."""
+    while lines > 0:
+        start = f.tell()
+        data = f.read(block)
+        if not data:
+            return
+        count = data.count(b'\n')
+        if count < lines:
+            lines -= count
+            continue
+        # Position just after the lines-th line break of this block
+        end = -1
+        for _ in range(lines):
+            end = data.index(b'\n', end + 1)
+        f.seek(start + end + 1)
+        return
+
+
+class ChunkReader:
+    """Reads a CSV or Parquet file in chunks whose size may change between reads.
+
+    skip_rows data rows are skipped first (e.g. to resume an interrupted job).
+    dtype maps CSV columns to fixed types (see input_dtypes); Parquet
+    columns already have theirs.
+    """
+
+    def __init__(self, path, batch_rows=PROBE_ROWS, skip_rows=0, dtype=None):
+        self.parquet = path.endswith('.parquet')
+        if self.parquet:
+            import pyarrow.parquet as pq
+            # Whole row groups are skipped from the metadata; only the first one kept may be sliced
+            parquet = pq.ParquetFile(path)
+            groups = []
+            for group in range(parquet.metadata.num_row_groups):
+                group_rows = parquet.metadata.row_group(group).num_rows
+                if skip_rows < group_rows:
+                    groups = list(range(group, parquet.metadata.num_row_groups))
+                    break
+                skip_rows -= group_rows
+            self.batches = parquet.iter_batches(batch_size=batch_rows, row_groups=groups) if groups else iter(())
+            self.pending = None
+            while skip_rows > 0 and (batch := next(self.batches, None)) is not None:
+                if batch.num_rows > skip_rows:
+                    self.pending = batch.slice(skip_rows)
+                skip_rows -= batch.num_rows
+        else:
+            # Resuming seeks past the consumed lines (like CSV shards, rows must not contain quoted
+            # newlines), so memory and time before the first chunk do not grow with the rows skipped
+            self.file = open(path, 'rb')
+            columns = pd.read_csv(io.BytesIO(self.file.readline()), nrows=0).columns.tolist()
+            skip_lines(self.file, skip_rows)
+            self.csv = pd.read_csv(self.file, chunksize=batch_rows, dtype=dtype, header=None, names=columns)
+
+    def read(self, rows):
+        """The next DataFrame of up to `rows` rows, or None at the end of the file."""
+        if not self.parquet:
+            try:
+                return self.csv.get_chunk(rows)
+            except StopIteration:
+                return None
+
+        import pyarrow as pa
+        batches, count = [], 0
+        while count < rows:
+            batch = self.pending if self.pending is not None else next(self.batches, None)
+            self.pending = None
+            if batch is None:
+                break
+            if count + batch.num_rows > rows:
+                batch, self.pending = batch.slice(0, rows - count), batch.slice(rows - count)
+            batches.append(batch)
+            count += batch.num_rows
+        return pa.Table.from_batches(batches).to_pandas() if batches else None
+
+    def close(self):
+        if not self.parquet:
+            self.csv.close()
+            self.file.close()
+
+
+def resident_memory():
+    """Resident set size of this process in bytes (None where /proc is unavailable)."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return None
+
+
+def status_columns(chunk):
+    """Growth assessment label per indicator ('<indicator>_status') from the percentile columns."""
+    age = chunk['age_months'].to_numpy(dtype=float)
+    return {f'{column[:-len("_percentile")]}_status':
+            lms.indicator_labels(chunk[column].to_numpy(dtype=float), column[:-len('_percentile')], age)
+            for column in chunk.columns if column.endswith('_percentile')}
+
+
+def _arrow_table(chunk):
+    """Scored chunk as an Arrow table, with dictionary-encoded assessment labels."""
+    import pyarrow as pa
+    table = pa.Table.from_pandas(chunk, preserve_index=False)
+    for name, labels in status_columns(chunk).items():
+        table = table.append_column(name, pa.array(labels).dictionary_encode())
+    return table
+
+
+def _file_schema(table):
+    """Schema of a Parquet file started with table: columns that are all null there are typed as strings."""
+    import pyarrow as pa
+    return pa.schema([field.with_type(pa.large_string()) if pa.types.is_null(field.type) else field
+                      for field in table.schema], metadata=table.schema.metadata)
+
+
+def age_bands(age):
+    """Age band key ('0_2', '2_5', or 'unknown' outside 0-60 months) for each age in months."""
+    bands = np.full(len(age), 'unknown', dtype=object)
+    for key, start, end in AGE_BANDS:
+        bands[(age >= start) & (age < end if key != AGE_BANDS[-1][0] else age <= end)] = key
+    return bands
+
+
+class ChunkWriter:
+    """Writes scored chunks to CSV or Parquet as they are produced."""
+
+    def __init__(self, path):
+        self.path = path
+        self.parquet = path.endswith('.parquet')
+        self.writer = None
+        self.first = True
+
+    def write(self, chunk):
+        if self.parquet:
+            import pyarrow.parquet as pq
+            table = _arrow_table(chunk)
+            # The file's schema is fixed by the first chunk; later chunks are cast to it
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.path, _file_schema(table))
+            self.writer.write_table(table.cast(self.writer.schema))
+        else:
+            chunk.to_csv(self.path, mode='w' if self.first else 'a', header=self.first, index=False)
+        self.first = False
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+class PartitionedWriter:
+    """Writes scored chunks into a Parquet dataset partitioned by sex and age band.
+
+    Files go to <root>/sex=<Boy|Girl|unknown>/age_band=<0_2|2_5|unknown>/<name>.parquet
+    (hive layout, so pyarrow/pandas/DuckDB/Spark read the partition keys back
+    as columns; the input's sex column is replaced by the normalized key). Each chunk is sorted by age before it is written in row
+    groups of PARTITION_ROW_GROUP_ROWS, and page indexes are written too, so
+    min/max statistics on age_months are tight enough for readers to skip
+    most of a partition for an age-range filter.
+    """
+
+    def __init__(self, root, sex_col, name='part'):
+        self.root = root
+        self.sex_col = sex_col
+        self.name = name
+        self.writers = {}
+
+    def write(self, chunk):
+        import pyarrow.parquet as pq
+        sex = normalize_sex(chunk[self.sex_col])
+        band = age_bands(chunk['age_months'].to_numpy(dtype=float))
+        keys = pd.DataFrame({'sex': np.where(sex == '', 'unknown', sex), 'age_band': band})
+        for (sex_key, band_key), rows in keys.groupby(['sex', 'age_band'], sort=False).indices.items():
+            part = chunk.iloc[rows].drop(columns=[self.sex_col]).sort_values('age_months', kind='stable')
+            table = _arrow_table(part)
+            writer = self.writers.get((sex_key, band_key))
+            if writer is None:
+                directory = os.path.join(self.root, f'sex={sex_key}', f'age_band={band_key}')
+                os.makedirs(directory, exist_ok=True)
+                writer = pq.ParquetWriter(os.path.join(directory, f'{self.name}.parquet'), _file_schema(table),
+                                          write_page_index=True)
+                self.writers[(sex_key, band_key)] = writer
+            writer.write_table(table.cast(writer.schema), row_group_size=PARTITION_ROW_GROUP_ROWS)
+
+    def close(self):
+        for writer in self.writers.values():
+            writer.close()
+
+
+def prepare_dataset(root):
+    """Create the dataset directory, removing the partitions of a previous run."""
+    os.makedirs(root, exist_ok=True)
+    for entry in os.listdir(root):
+        if entry.startswith('sex='):
+            shutil.rmtree(os.path.join(root, entry))
+
+
+def open_writer(path, args, name='part'):
+    """Writer for scored chunks: a partitioned dataset with --partition, else one CSV/Parquet file."""
+    if getattr(args, 'partition', False):
+        return PartitionedWriter(path, args.sex_col, name)
+    return ChunkWriter(path)
+
+
+def select_measurements(engine, columns, args):
+    """{measurement type: column} for the measurement columns present that the engine can score."""
+    requested = {'height': args.length_col, 'weight': args.weight_col, 'head': args.head_col}
+    measurements = {}
+    for measurement_type, column in requested.items():
+        if column not in columns:
+            continue
+        if measurement_type not in engine.measurement_types:
+            print(f"No LMS reference tables for {measurement_type}; skipping column '{column}'", file=sys.stderr)
+            continue
+        measurements[measurement_type] = column
+    return measurements
+
+
+class ScoringPipeline:
+    """Streams a visit file through reader -> scorer -> writer stages over bounded queues.
+
+    The reader and writer run in threads (parsing, Parquet and NumPy work
+    release the GIL), the scorer in the calling thread. A full queue blocks
+    the stage feeding it, so at most 2 * depth + 3 chunks exist at once. With
+    max_memory (bytes) the chunk size is set from the bytes per row of a small
+    first chunk; whenever the process is above the ceiling the reader waits
+    for the queues to drain, then halves the chunk size, and gives up with
+    MemoryError once chunks are as small as allowed.
+    """
+
+    def __init__(self, engine, args, depth=QUEUE_DEPTH, max_memory=None):
+        self.engine = engine
+        self.args = args
+        self.depth = depth
+        self.max_memory = max_memory
+        self.chunk_rows = PROBE_ROWS if max_memory else args.chunk_size
+        self.stop = threading.Event()
+        self.errors = []
+        self.peak_memory = 0
+
+    def run(self, input_path, output_path):
+        """Score input_path into output_path; returns the row count."""
+        if self.max_memory and (resident_memory() or 0) >= self.max_memory:
+            raise MemoryError(f"Memory ceiling of {self.max_memory / 2**20:.0f} MB is below the scorer's own footprint")
+        to_score, to_write = queue.Queue(self.depth), queue.Queue(self.depth)
+        reader = threading.Thread(target=self._guard, args=(self._read, input_path, to_score, to_write), daemon=True)
+        writer = threading.Thread(target=self._guard, args=(self._write, output_path, to_write), daemon=True)
+        reader.start()
+        writer.start()
+
+        rows = 0
+        measurements = None
+        try:
+            while (chunk := self._get(to_score)) is not None:
+                if measurements is None:
+                    measurements = select_measurements(self.engine, chunk.columns, self.args)
+                input_bytes = chunk.memory_usage(deep=True).sum() if self.max_memory and rows == 0 else 0
+                rows += len(chunk)
+                scored = score_chunk(self.engine, chunk, self.args, measurements)
+                if input_bytes:
+                    self._size_chunks((input_bytes + scored.memory_usage(deep=True).sum()) / len(scored))
+                del chunk
+                self._put(to_write, scored)
+                del scored
+            self._put(to_write, None)
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+        reader.join()
+        writer.join()
+        if self.errors:
+            raise self.errors[0]
+        return rows
+
+    def _guard(self, stage, *args):
+        # Any stage failing stops the others, and run() re-raises the first error
+        try:
+            stage(*args)
+        except BaseException as e:
+            self.errors.append(e)
+            self.stop.set()
+
+    def _put(self, q, item):
+        while not self.stop.is_set():
+            try:
+                q.put(item, timeout=0.05)
+                return
+            except queue.Full:
+                pass
+
+    def _get(self, q):
+        while not self.stop.is_set():
+            try:
+                return q.get(timeout=0.05)
+            except queue.Empty:
+                pass
+        return None
+
+    def _read(self, input_path, to_score, to_write):
+        reader = ChunkReader(input_path, min(self.chunk_rows, PROBE_ROWS),
+                             dtype=input_dtypes(input_path, self.args))
+        try:
+            while not self.stop.is_set():
+                self._wait_for_memory(to_score, to_write)
+                chunk = reader.read(self.chunk_rows)
+                self._put(to_score, chunk)
+                if chunk is None:
+                    return
+        finally:
+            reader.close()
+
+    def _write(self, output_path, to_write):
+        writer = open_writer(output_path, self.args)
+        try:
+            while (chunk := self._get(to_write)) is not None:
+                writer.write(chunk)
+                del chunk
+        finally:
+            writer.close()
+
+    def _size_chunks(self, bytes_per_row):
+        """Pick the chunk size that keeps every chunk in flight (with working copies) under the ceiling."""
+        budget = self.max_memory - (resident_memory() or 0)
+        in_flight = 2 * self.depth + 3
+        rows = int(budget / (2 * in_flight * bytes_per_row))
+        self.chunk_rows = max(MIN_CHUNK_ROWS, min(self.args.chunk_size, rows))
+
+    def _wait_for_memory(self, *queues):
+        if not self.max_memory:
+            return
+        memory = resident_memory()
+        if memory is None:
+            return
+        self.peak_memory = max(self.peak_memory, memory)
+        if memory < self.max_memory:
+            return
+        # Over the ceiling: let the downstream stages drain, then retry with smaller chunks
+        while any(not q.empty() for q in queues) and not self.stop.is_set():
+            time.sleep(0.01)
+        if (resident_memory() or 0) < self.max_memory:
+            return
+        if self.chunk_rows <= MIN_CHUNK_ROWS:
+            raise MemoryError(f"Scoring needs more than the {self.max_memory / 2**20:.0f} MB memory ceiling")
+        self.chunk_rows = max(MIN_CHUNK_ROWS, self.chunk_rows // 2)
+
+
+def score_file(input_path, output_path, args, engine=None):
+    """Stream every visit in input_path through the scoring pipeline; returns the row count."""
+    engine = engine or refcache.load_engine()
+    if getattr(args, 'partition', False):
+        prepare_dataset(output_path)
+    max_memory = args.max_memory * 2**20 if getattr(args, 'max_memory', None) else None
+    pipeline = ScoringPipeline(engine, args, getattr(args, 'queue_depth', QUEUE_DEPTH), max_memory)
+    return pipeline.run(input_path, output_path)
+
+
+def plan_shards(path, shard_bytes=SHARD_BYTES):
+    """Split an input file into shards: (start, end) byte ranges of CSV rows, or lists of Parquet row groups."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        metadata = pq.ParquetFile(path).metadata
+        shards, current, size = [], [], 0
+        for group in range(metadata.num_row_groups):
+            current.append(group)
+            size += metadata.row_group(group).total_byte_size
+            if size >= shard_bytes:
+                shards.append(current)
+                current, size = [], 0
+        return shards + [current] if current else shards
+
+    # CSV: cut at the first line break after each target offset (rows must not contain quoted newlines)
+    total = os.path.getsize(path)
+    shards = []
+    with open(path, 'rb') as f:
+        f.readline()
+        start = f.tell()
+        while start < total:
+            f.seek(min(start + shard_bytes, total))
+            f.readline()
+            end = min(f.tell(), total)
+            shards.append((start, end))
+            start = end
+    return shards
+
+
+def read_shard(path, shard, chunk_size, dtype=None):
+    """Yield DataFrame chunks of one shard from plan_shards() (dtype as for ChunkReader)."""
+    if path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunk_size, row_groups=shard):
+            yield batch.to_pandas()
+        return
+    start, end = shard
+    with open(path, 'rb') as f:
+        header = f.readline()
+        f.seek(start)
+        data = f.read(end - start)
+    yield from pd.read_csv(io.BytesIO(header + data), chunksize=chunk_size, dtype=dtype)
+
+
+def shared_reference_cache():
+    """Path of a compiled reference cache for workers to map, and whether it is a temporary copy."""
+    if refcache.open_cache() is not None:
+        return refcache.CACHE_FILE, False
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else None
+    fd, path = tempfile.mkstemp(prefix='growth-reference-', suffix='.bin', dir=directory)
+    os.close(fd)
+    refcache.build_cache(path)
+    return path, True
+
+
+# Per-process state of the parallel workers (set by _init_worker)
+_worker = {}
+
+
+def _init_worker(cache_path, args, measurements):
+    # Attach to the shared, memory-mapped tables; only the small interpolation index is per process
+    _worker['engine'] = refcache.ReferenceCache(cache_path).engine()
+    _worker['args'] = args
+    _worker['measurements'] = measurements
+
+
+def _score_shard(task):
+    input_path, shard, part_path, index = task
+    engine, args, measurements = _worker['engine'], _worker['args'], _worker['measurements']
+    writer = open_writer(part_path, args, f'part-{index:05d}')
+    rows = 0
+    try:
+        for chunk in read_shard(input_path, shard, args.chunk_size, input_dtypes(input_path, args)):
+            writer.write(score_chunk(engine, chunk, args, measurements))
+            rows += len(chunk)
+    finally:
+        writer.close()
+    return rows, part_path
+
+
+def _append_part(output, part_path, parquet_writer, first):
+    """Append one scored part file to the output; returns the (possibly new) Parquet writer."""
+    if part_path.endswith('.parquet'):
+        import pyarrow.parquet as pq
+        part = pq.ParquetFile(part_path)
+        for group in range(part.num_row_groups):
+            table = part.read_row_group(group)
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(output, table.schema)
+            parquet_writer.write_table(table.cast(parquet_writer.schema))
+    else:
+        with open(part_path, 'rb') as f:
+            if not first:
+                f.readline()
+            shutil.copyfileobj(f, output, 16 * 2**20)
+    os.remove(part_path)
+    return parquet_writer
+
+
+def score_file_parallel(input_path, output_path, args, workers):
+    """Score input_path with a process pool over shards of the file; returns the row count."""
+    shards = plan_shards(input_path)
+    if not shards:
+        # No rows to split (e.g. a header-only CSV): the single process writes the header or schema
+        return score_file(input_path, output_path, args)
+    cache_path, temporary = shared_reference_cache()
+    try:
+        engine = refcache.ReferenceCache(cache_path).engine()
+        columns = next(read_shard(input_path, shards[0], 1)).columns
+        measurements = select_measurements(engine, columns, args)
+
+        if args.partition:
+            # Every shard writes its own files straight into the dataset; there is nothing to merge
+            prepare_dataset(output_path)
+            tasks = [(input_path, shard, output_path, i) for i, shard in enumerate(shards)]
+            with multiprocessing.Pool(workers, initializer=_init_worker,
+                                      initargs=(cache_path, args, measurements)) as pool:
+                return sum(part_rows for part_rows, _ in pool.imap_unordered(_score_shard, tasks))
+
+        suffix = '.parquet' if output_path.endswith('.parquet') else '.csv'
+        parts_dir = tempfile.mkdtemp(prefix='.scoring-', dir=os.path.dirname(os.path.abspath(output_path)))
+        tasks = [(input_path, shard, os.path.join(parts_dir, f'part-{i:05d}{suffix}'), i)
+                 for i, shard in enumerate(shards)]
+
+        rows = 0
+        parquet_writer = None
+        # Parquet parts go to one writer on output_path, CSV parts are appended to an open file
+        output = output_path if suffix == '.parquet' else open(output_path, 'wb')
+        try:
+            with multiprocessing.Pool(workers, initializer=_init_worker,
+                                      initargs=(cache_path, args, measurements)) as pool:
+                # Parts come back in input order and are appended as soon as they are done
+                for i, (part_rows, part_path) in enumerate(pool.imap(_score_shard, tasks)):
+                    parquet_writer = _append_part(output, part_path, parquet_writer, first=(i == 0))
+                    rows += part_rows
+        finally:
+            if suffix != '.parquet':
+                output.close()
+            if parquet_writer is not None:
+                parquet_writer.close()
+            shutil.rmtree(parts_dir, ignore_errors=True)
+        return rows
+    finally:
+        if temporary:
+            os.remove(cache_path)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Score a visit file against the WHO growth standards.")
+    parser.add_argument('input', help="Visit file (.csv or .parquet)")
+    parser.add_argument('output', help="Scored output file (.csv or .parquet)")
+    parser.add_argument('--partition', action='store_true',
+                        help="Write a Parquet dataset into the output directory, partitioned by sex and age band")
+    parser.add_argument('--chunk-size', type=int, default=250_000, help="Rows per chunk (default: 250000)")
+    parser.add_argument('--queue-depth', type=int, default=QUEUE_DEPTH,
+                        help=f"Chunks buffered between reader, scorer and writer (default: {QUEUE_DEPTH})")
+    parser.add_argument('--max-memory', type=float, metavar='MB',
+                        help="Memory ceiling in MB for single-process scoring; chunk sizes adapt to stay under it")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="Worker processes; above 1 the file is scored in parallel shards (default: 1)")
+    add_column_arguments(parser)
+    return parser
+
+
+def add_column_arguments(parser):
+    """Input column options shared by the batch tools."""
+    parser.add_argument('--sex-col', default='sex')
+    parser.add_argument('--age-col', default='age_months', help="Age in months (used when present)")
+    parser.add_argument('--dob-col', default='dob', help="Date of birth (used when there is no age column)")
+    parser.add_argument('--date-col', default='visit_date', help="Visit date (used with --dob-col)")
+    parser.add_argument('--length-col', default='length', help="Length/height in cm")
+    parser.add_argument('--weight-col', default='weight', help="Weight in kg")
+    parser.add_argument('--head-col', default='head_circumference', help="Head circumference in cm")
+    parser.add_argument('--position-col', default='position',
+                        help="Optional measurement position: recumbent/standing (or L/H)")
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if not os.path.exists(args.input):
+        print(f"Input file not found: {args.input}", file=sys.stderr)
+        return 1
+
+    start = time.perf_counter()
+    try:
+        if args.workers > 1:
+            rows = score_file_parallel(args.input, args.output, args, args.workers)
+        else:
+            rows = score_file(args.input, args.output, args)
+    except MemoryError as e:
+        print(e, file=sys.stderr)
+        return 1
+    elapsed = time.perf_counter() - start
+    rate = rows / elapsed * 60 if elapsed > 0 else float('inf')
+    print(f"Scored {rows} visits in {elapsed:.1f}s ({rate:,.0f} rows/min) -> {args.output}", file=sys.stderr)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
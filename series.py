@@ -0,0 +1,123 @@
+# Longitudinal growth series: every visit of one child, scored incrementally
+import numpy as np
+
+import lms
+
+MEASUREMENT_TYPES = ('height', 'weight')
+
+
+class PatientSeries:
+    """All visits of one child with their z-scores and percentiles stored alongside.
+
+    Visits are kept in growable NumPy arrays sorted by age. Adding visits
+    only scores the new rows; stored scores are never recomputed, so a
+    chart or velocity calculation over 30 visits is plain array slicing.
+    """
+
+    def __init__(self, sex, engine, capacity=16):
+        self.sex = sex
+        self.engine = engine
+        self.count = 0
+        self._age = np.empty(capacity)
+        self._values = {m: np.empty(capacity) for m in MEASUREMENT_TYPES}
+        self._z = {m: np.empty(capacity) for m in MEASUREMENT_TYPES}
+        self._percentile = {m: np.empty(capacity) for m in MEASUREMENT_TYPES}
+
+    def __len__(self):
+        return self.count
+
+    def _reserve(self, extra):
+        """Grow the arrays (doubling) so extra more visits fit."""
+        needed = self.count + extra
+        capacity = len(self._age)
+        if needed <= capacity:
+            return
+        while capacity < needed:
+            capacity *= 2
+
+        def grow(array):
+            grown = np.empty(capacity)
+            grown[:self.count] = array[:self.count]
+            return grown
+
+        self._age = grow(self._age)
+        for m in MEASUREMENT_TYPES:
+            self._values[m] = grow(self._values[m])
+            self._z[m] = grow(self._z[m])
+            self._percentile[m] = grow(self._percentile[m])
+
+    def add_visits(self, age, height=None, weight=None):
+        """Append one or more visits (age in months) and score only those visits.
+
+        A missing measurement is stored as NaN (and scores as NaN).
+        """
+        age = np.atleast_1d(np.asarray(age, dtype=float))
+        new = len(age)
+        self._reserve(new)
+        start, end = self.count, self.count + new
+
+        self._age[start:end] = age
+        for m, values in (('height', height), ('weight', weight)):
+            values = np.full(new, np.nan) if values is None else np.broadcast_to(np.asarray(values, dtype=float), age.shape)
+            self._values[m][start:end] = values
+            if self.engine.has_indicator(self.sex, m):
+                z, percentile = self.engine.score(self.sex, age, values, m)
+            else:
+                z = percentile = np.full(new, np.nan)
+            self._z[m][start:end] = z
+            self._percentile[m][start:end] = percentile
+        self.count = end
+
+        # Keep visits in age order; only reorders when a visit arrives out of order
+        if (start and age.min() < self._age[start - 1]) or not np.all(np.diff(age) >= 0):
+            order = np.argsort(self._age[:end], kind='stable')
+            self._age[:end] = self._age[:end][order]
+            for m in MEASUREMENT_TYPES:
+                self._values[m][:end] = self._values[m][:end][order]
+                self._z[m][:end] = self._z[m][:end][order]
+                self._percentile[m][:end] = self._percentile[m][:end][order]
+
+    @property
+    def ages(self):
+        return self._age[:self.count]
+
+    def values(self, measurement_type):
+        return self._values[measurement_type][:self.count]
+
+    def zscores(self, measurement_type):
+        return self._z[measurement_type][:self.count]
+
+    def percentiles(self, measurement_type):
+        return self._percentile[measurement_type][:self.count]
+
+    def percentile_status(self, measurement_type):
+        """Growth assessment label for every visit."""
+        return lms.indicator_labels(self.percentiles(measurement_type), measurement_type, self.ages())
+
+    def latest(self, measurement_type):
+        """(age, value) of the most recent visit with this measurement, or None."""
+        values = self.values(measurement_type)
+        measured = np.flatnonzero(~np.isnan(values))
+        if not len(measured):
+            return None
+        return self.ages[measured[-1]], values[measured[-1]]
+
+    def velocity(self, measurement_type):
+        """Change per month between consecutive visits (ages of the later visit, rates)."""
+        values = self.values(measurement_type)
+        measured = ~np.isnan(values)
+        ages, values = self.ages[measured], values[measured]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return ages[1:], np.diff(values) / np.diff(ages)
+
+    def velocity_percentiles(self, measurement_type, velocity_engine):
+        """WHO velocity percentile between consecutive visits (ages of the later visit, percentiles).
+
+        NaN where no WHO increment table covers the interval between the visits.
+        """
+        values = self.values(measurement_type)
+        ages = self.ages[~np.isnan(values)]
+        if not velocity_engine.has_indicator(self.sex, measurement_type):
+            return ages[1:], np.full(max(len(ages) - 1, 0), np.nan)
+        z = velocity_engine.series_zscores(self.sex, self.ages, values, measurement_type)
+        return ages[1:], lms.zscore_to_percentile(z)
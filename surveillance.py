@@ -0,0 +1,195 @@
+# Population surveillance: prevalence of stunting, underweight and wasting by clinic, month and sex
+#
+# Usage:
+#   python surveillance.py visits_2024_05.csv --state surveillance.json --report prevalence.csv
+#   python surveillance.py visits_2024_06.csv --state surveillance.json --report prevalence.csv
+#   python surveillance.py --state surveillance.json --by clinic,month      # report only
+#
+# Each extract is streamed in chunks, scored with the LMS engine and reduced
+# to counts per (clinic, month, sex). The counts of every extract are kept in
+# the state file, so a new monthly extract only costs its own scoring, and an
+# extract delivered again under the same name replaces its earlier counts.
+# Counts are additive, so any coarser grouping (--by) is summed from them.
+#
+# A visit counts towards an indicator when its z-score is plausible (WHO
+# flags, see PLAUSIBLE_Z); it is a case below -2 SD. Prevalence comes with a
+# Wilson score confidence interval.
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import refcache
+import score_visits
+
+# Indicator -> (GrowthEngine.score_visits indicator, case when z is below this)
+INDICATORS = {
+    'stunting': ('height', -2.0),
+    'underweight': ('weight', -2.0),
+    'wasting': ('weight_for_length', -2.0),
+}
+
+# WHO flags for biologically implausible z-scores: visits outside these ranges are left out
+PLAUSIBLE_Z = {
+    'height': (-6.0, 6.0),
+    'weight': (-6.0, 5.0),
+    'weight_for_length': (-5.0, 5.0),
+}
+
+GROUP_KEYS = ['clinic', 'month', 'sex']
+
+# Two-sided 95% normal quantile for the confidence intervals
+CONFIDENCE_Z = 1.959964
+
+
+def visit_months(chunk, args):
+    """Visit month ('2024-05') of every visit; 'unknown' without a usable visit date."""
+    if args.date_col not in chunk.columns:
+        return np.full(len(chunk), 'unknown', dtype=object)
+    dates = pd.to_datetime(chunk[args.date_col], errors='coerce')
+    return dates.dt.strftime('%Y-%m').fillna('unknown').to_numpy(dtype=object)
+
+
+def chunk_counts(engine, chunk, args, measurements):
+    """Visits and cases per indicator, grouped by clinic, month and sex, for one chunk."""
+    sex, _, results = score_visits.chunk_scores(engine, chunk, args, measurements)
+    clinic = (chunk[args.clinic_col].fillna('unknown').astype(str).to_numpy(dtype=object)
+              if args.clinic_col in chunk.columns else np.full(len(chunk), 'all', dtype=object))
+    frame = pd.DataFrame({'clinic': clinic, 'month': visit_months(chunk, args),
+                          'sex': np.where(sex == '', 'unknown', sex)})
+    for indicator, (source, cutoff) in INDICATORS.items():
+        if source not in results:
+            continue
+        z = results[source][0]
+        low, high = PLAUSIBLE_Z[source]
+        with np.errstate(invalid='ignore'):
+            counted = (z >= low) & (z <= high)
+            frame[f'{indicator}_n'] = counted.astype(np.int64)
+            frame[f'{indicator}_cases'] = (counted & (z < cutoff)).astype(np.int64)
+    return frame.groupby(GROUP_KEYS).sum()
+
+
+def extract_counts(path, args, engine=None):
+    """Counts per (clinic, month, sex) for one visit extract, read in chunks."""
+    engine = engine or refcache.load_engine()
+    reader = score_visits.ChunkReader(path, args.chunk_size, dtype=score_visits.input_dtypes(path, args))
+    counts = []
+    measurements = None
+    try:
+        while (chunk := reader.read(args.chunk_size)) is not None:
+            if measurements is None:
+                measurements = score_visits.select_measurements(engine, chunk.columns, args)
+            counts.append(chunk_counts(engine, chunk, args, measurements))
+    finally:
+        reader.close()
+    if not counts:
+        return pd.DataFrame(columns=GROUP_KEYS).set_index(GROUP_KEYS)
+    return pd.concat(counts).groupby(level=GROUP_KEYS).sum()
+
+
+def wilson_interval(cases, n, z=CONFIDENCE_Z):
+    """Wilson score interval (low, high) of proportions cases/n; NaN where n is 0."""
+    cases = np.asarray(cases, dtype=float)
+    n = np.asarray(n, dtype=float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        p = cases / n
+        denominator = 1 + z**2 / n
+        centre = (p + z**2 / (2 * n)) / denominator
+        half_width = z * np.sqrt(p * (1 - p) / n + z**2 / (4 * n**2)) / denominator
+    return centre - half_width, centre + half_width
+
+
+def prevalence(counts, by=GROUP_KEYS):
+    """Report of visits, cases, prevalence and 95% CI (percent) per indicator, grouped by `by`."""
+    totals = counts.groupby(level=list(by)).sum() if len(counts) else counts
+    report = pd.DataFrame(index=totals.index)
+    for indicator in INDICATORS:
+        if f'{indicator}_n' not in totals.columns:
+            continue
+        n, cases = totals[f'{indicator}_n'], totals[f'{indicator}_cases']
+        low, high = wilson_interval(cases, n)
+        report[f'{indicator}_n'] = n
+        report[f'{indicator}_cases'] = cases
+        with np.errstate(invalid='ignore', divide='ignore'):
+            report[f'{indicator}_prevalence'] = np.round(100 * cases / n, 2)
+        report[f'{indicator}_ci_low'] = np.round(100 * low, 2)
+        report[f'{indicator}_ci_high'] = np.round(100 * high, 2)
+    return report.reset_index()
+
+
+def load_state(path):
+    """Counts per extract from the state file: {extract name: counts DataFrame}."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        state = json.load(f)
+    return {name: pd.DataFrame(extract['data'], columns=extract['columns']).set_index(GROUP_KEYS)
+            for name, extract in state['extracts'].items()}
+
+
+def save_state(path, extracts):
+    state = {'extracts': {name: counts.reset_index().to_dict(orient='split', index=False)
+                          for name, counts in extracts.items()}}
+    with open(path + '.tmp', 'w') as f:
+        json.dump(state, f)
+    os.replace(path + '.tmp', path)
+
+
+def combined_counts(extracts):
+    """Counts summed over all extracts (indicators missing from an extract count as 0)."""
+    if not extracts:
+        return pd.DataFrame(columns=GROUP_KEYS).set_index(GROUP_KEYS)
+    return pd.concat(extracts.values()).fillna(0).astype(np.int64).groupby(level=GROUP_KEYS).sum()
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Prevalence of stunting, underweight and wasting by cohort.")
+    parser.add_argument('extracts', nargs='*', help="Visit extracts (.csv or .parquet) to add or replace")
+    parser.add_argument('--state', help="JSON file keeping the counts of every extract between runs")
+    parser.add_argument('--report', help="Write the prevalence report to this CSV (default: print it)")
+    parser.add_argument('--by', default=','.join(GROUP_KEYS),
+                        help=f"Report grouping, a subset of {','.join(GROUP_KEYS)} (default: all three)")
+    parser.add_argument('--clinic-col', default='clinic')
+    parser.add_argument('--chunk-size', type=int, default=250_000, help="Rows per chunk (default: 250000)")
+    score_visits.add_column_arguments(parser)
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    by = [key.strip() for key in args.by.split(',') if key.strip()]
+    if not by or set(by) - set(GROUP_KEYS):
+        print(f"--by must name some of: {', '.join(GROUP_KEYS)}", file=sys.stderr)
+        return 1
+    missing = [path for path in args.extracts if not os.path.exists(path)]
+    if missing:
+        print(f"Input file not found: {', '.join(missing)}", file=sys.stderr)
+        return 1
+
+    extracts = load_state(args.state)
+    engine = refcache.load_engine() if args.extracts else None
+    for path in args.extracts:
+        start = time.perf_counter()
+        name = os.path.basename(path)
+        action = "Replaced" if name in extracts else "Added"
+        extracts[name] = extract_counts(path, args, engine)
+        visits = int(extracts[name].filter(like='_n').max(axis=1).sum())
+        print(f"{action} {name}: {visits} visits in {time.perf_counter() - start:.1f}s", file=sys.stderr)
+    if args.state and args.extracts:
+        save_state(args.state, extracts)
+
+    report = prevalence(combined_counts(extracts), by)
+    if args.report:
+        report.to_csv(args.report, index=False)
+        print(f"Wrote {len(report)} groups from {len(extracts)} extracts -> {args.report}", file=sys.stderr)
+    else:
+        print(report.to_string(index=False))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
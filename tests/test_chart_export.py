@@ -0,0 +1,57 @@
+# Disk cache of exported chart images: expiry, size-bounded eviction and counters
+import os
+
+import chart_export
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_images_expire_after_max_age(tmp_path):
+    clock = Clock()
+    cache = chart_export.ImageCache(str(tmp_path), max_age=60, clock=clock)
+    cache.put('ab' * 32, 'png', b'image')
+    clock.now += 59
+    assert cache.get('ab' * 32, 'png') == b'image'
+    # The view renewed it; unviewed for longer than max_age it is gone
+    clock.now += 61
+    assert cache.get('ab' * 32, 'png') is None
+    assert not os.path.exists(cache.path('ab' * 32, 'png'))
+    assert cache.stats()['expirations'] == 1
+
+
+def test_least_recently_viewed_images_are_evicted(tmp_path):
+    clock = Clock()
+    cache = chart_export.ImageCache(str(tmp_path), max_bytes=350, clock=clock)
+    keys = [f'{i:02d}' * 32 for i in range(3)]
+    for key in keys:
+        cache.put(key, 'svg', b'x' * 100)
+        clock.now += 1
+    assert cache.get(keys[0], 'svg') is not None
+    clock.now += 1
+
+    # 400 bytes > 350: the least recently viewed go until within 90% of the budget
+    cache.put('99' * 32, 'svg', b'x' * 100)
+    assert cache.get(keys[1], 'svg') is None
+    assert cache.get(keys[0], 'svg') is not None
+    assert cache.get(keys[2], 'svg') is not None
+    stats = cache.stats()
+    assert stats['evictions'] == 1 and stats['bytes'] == 300
+    assert (stats['hits'], stats['misses']) == (3, 1)
+
+
+def test_prune_sees_images_written_by_other_processes(tmp_path):
+    clock = Clock()
+    other = chart_export.ImageCache(str(tmp_path), clock=clock)
+    for i in range(4):
+        other.put(f'{i:02d}' * 32, 'png', b'x' * 100)
+    clock.now += 1
+    cache = chart_export.ImageCache(str(tmp_path), max_bytes=250, clock=clock)
+    cache.put('99' * 32, 'png', b'x' * 100)
+    assert cache.stats()['bytes'] <= 250 * chart_export.PRUNE_TO
+    assert cache.get('99' * 32, 'png') is not None
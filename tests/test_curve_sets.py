@@ -0,0 +1,64 @@
+# Reference curve sets: centile inversion, labels and the memoized curves
+import gc
+import weakref
+
+import numpy as np
+import pytest
+
+import curve_sets
+import lms
+
+SD_LINES = "SD lines (-3 to +3)"
+ALL_CENTILES = "All WHO centiles (0.1st-99.9th)"
+
+
+def test_centile_zscores_invert_the_engine_cdf():
+    centiles = np.array([0.1, 1, 2.5, 3, 15, 50, 85, 97, 97.5, 99.9])
+    z = curve_sets.centile_zscores(centiles)
+    np.testing.assert_allclose(lms.zscore_to_percentile(z), centiles, atol=1e-9)
+    # Standard normal quantiles (the CDF approximation is good to ~1e-7)
+    np.testing.assert_allclose(z[[0, 2, 5, 8, 9]], [-3.090232, -1.959964, 0, 1.959964, 3.090232], atol=1e-4)
+    np.testing.assert_allclose(z, -curve_sets.centile_zscores(100 - centiles), atol=1e-9)
+
+
+def test_band_labels():
+    assert curve_sets.band_labels(None) == lms.PERCENTILE_LABELS
+    sd = curve_sets.band_labels(SD_LINES)
+    assert sd[0] == "Below -3 SD" and sd[-1] == "Above +3 SD"
+    assert sd[3] == "Between -1 SD and 0 SD"
+    assert len(sd) == 8
+    assert curve_sets.band_labels(ALL_CENTILES)[:3] == [
+        "Below 0.1st percentile", "Between 0.1st-1st percentile", "Between 1st-3rd percentile"]
+    assert curve_sets.band_labels(('percentile', (11, 50, 92)))[1:3] == [
+        "Between 11th-50th percentile", "Between 50th-92nd percentile"]
+
+
+def test_status_labels():
+    # The default set keeps the engine's own wording
+    percentile = np.array([1.0, 60.0, np.nan])
+    np.testing.assert_array_equal(curve_sets.status_labels([-2.3, 0.25, np.nan], percentile, 'weight'),
+                                  lms.percentile_labels(percentile, 'weight'))
+    # A z-score on a line belongs to the band above it
+    labels = curve_sets.status_labels([-3.5, -2.5, -2.0, 0.0, 3.2, np.nan], None, 'height', SD_LINES)
+    assert labels.tolist() == [
+        "Below -3 SD (height)", "Between -3 SD and -2 SD (height)", "Between -2 SD and -1 SD (height)",
+        "Between 0 SD and +1 SD (height)", "Above +3 SD (height)", "No data available for height"]
+    z = curve_sets.centile_zscores([2])
+    assert curve_sets.status_labels(z, None, 'head', ALL_CENTILES)[0] == "Between 1st-3rd percentile (head)"
+
+
+def test_reference_curves_follow_the_tables_not_the_engine():
+    engine = lms.load_engine()
+    curves = curve_sets.reference_curves(engine, 'Girl', 'weight', SD_LINES, (0, 24))
+    table = engine.tables[('Girl', 'weight', 'age')]
+    months = curves['age'] <= 24
+    np.testing.assert_allclose(curves['SD0'][months], table.lms(curves['age'][months])[1])
+    with pytest.raises(ValueError):
+        curves['SD0'][0] = 0
+
+    # Another engine over the same tables shares the entry, and the cache keeps neither alive
+    assert curve_sets.reference_curves(lms.load_engine(), 'Girl', 'weight', SD_LINES, (0, 24)) is curves
+    engine_ref = weakref.ref(engine)
+    del engine, table
+    gc.collect()
+    assert engine_ref() is None
@@ -0,0 +1,92 @@
+# Bulk importer regressions
+import numpy as np
+import pandas as pd
+
+import import_visits
+import patient_store
+
+
+def test_integer_ids_with_gaps_stay_one_patient(tmp_path):
+    # Chunks with a missing id read the id column as float64 (123.0)
+    ids = np.arange(2000) % 500
+    visits = pd.DataFrame({
+        'patient_id': pd.array(ids, dtype='Int64'),
+        'sex': 'F',
+        'age_months': 12.0,
+        'length': 75.0,
+        'weight': 9.0,
+    })
+    visits.loc[1500, 'patient_id'] = pd.NA
+    visits.to_csv(tmp_path / 'history.csv', index=False)
+    visits.astype({'patient_id': float}).to_parquet(tmp_path / 'history.parquet')
+
+    for source in ['history.csv', 'history.parquet']:
+        db = tmp_path / f'{source}.db'
+        assert import_visits.main([str(tmp_path / source), '--db', str(db), '--chunk-size', '400']) == 0
+        store = patient_store.PatientStore(str(db))
+        assert store.db.execute("SELECT count(*) FROM patients").fetchone()[0] == 500
+        assert store.patient('123')['visits'] == 4
+        store.close()
+
+
+def test_interrupted_import_resumes_from_checkpoint(tmp_path, monkeypatch):
+    visits = pd.DataFrame({
+        'patient_id': np.arange(3000) % 700,
+        'sex': np.where(np.arange(3000) % 2, 'M', 'F'),
+        'age_months': np.arange(3000) % 60 + 0.5,
+        'length': 80.0,
+        'weight': 11.0,
+    })
+    visits.to_csv(tmp_path / 'history.csv', index=False)
+    # Row groups smaller than the chunks, so resuming skips whole groups and slices one
+    visits.to_parquet(tmp_path / 'history.parquet', row_group_size=250)
+    write_chunk = import_visits.VisitImporter._write_chunk
+
+    for source in ['history.csv', 'history.parquet']:
+        db = str(tmp_path / f'{source}.db')
+        argv = [str(tmp_path / source), '--db', db, '--chunk-size', '400']
+        calls = []
+
+        def interrupt_third(self, chunk, measurements):
+            calls.append(len(chunk))
+            if len(calls) == 3:
+                raise KeyboardInterrupt
+            return write_chunk(self, chunk, measurements)
+
+        monkeypatch.setattr(import_visits.VisitImporter, '_write_chunk', interrupt_third)
+        assert import_visits.main(argv) == 130
+        monkeypatch.setattr(import_visits.VisitImporter, '_write_chunk', write_chunk)
+        assert import_visits.main(argv) == 0
+
+        store = patient_store.PatientStore(db)
+        rows = store.db.execute("SELECT age_months FROM visits ORDER BY id").fetchall()
+        assert len(rows) == 3000
+        assert [age for age, in rows] == visits['age_months'].tolist()
+        assert store.db.execute("SELECT count(*) FROM patients").fetchone()[0] == 700
+        store.close()
+
+
+def test_resume_refuses_a_same_size_edit_and_keeps_the_history_index(tmp_path, monkeypatch):
+    visits = pd.DataFrame({'patient_id': np.arange(1000), 'sex': 'F', 'age_months': 12.0,
+                           'length': 75.0, 'weight': 9.0})
+    source = tmp_path / 'history.csv'
+    visits.to_csv(source, index=False)
+    db = str(tmp_path / 'patients.db')
+    argv = [str(source), '--db', db, '--chunk-size', '300']
+    write_chunk = import_visits.VisitImporter._write_chunk
+    indexes = []
+
+    def interrupt_second(self, chunk, measurements):
+        indexes.extend(self.db.execute("SELECT name FROM sqlite_master WHERE type = 'index'").fetchall())
+        if len(indexes) > 1:
+            raise KeyboardInterrupt
+        return write_chunk(self, chunk, measurements)
+
+    monkeypatch.setattr(import_visits.VisitImporter, '_write_chunk', interrupt_second)
+    assert import_visits.main(argv) == 130
+    assert ('visits_patient_date',) in indexes
+
+    # Same size, different contents: the checkpoint no longer applies
+    source.write_text(source.read_text().replace('12.0,75.0', '13.0,75.0'))
+    monkeypatch.setattr(import_visits.VisitImporter, '_write_chunk', write_chunk)
+    assert import_visits.main(argv) == 1
@@ -0,0 +1,101 @@
+# LMS engine against the published WHO tables
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import lms
+import score_visits
+
+# Published centile columns and the z-score each one sits at
+CENTILE_Z = {'P3': -1.880794, 'P50': 0.0, 'P97': 1.880794}
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return lms.load_engine()
+
+
+def read_table(name):
+    return np.genfromtxt(os.path.join(lms.DATA_DIR, name + '.csv'), delimiter=',', names=True)
+
+
+@pytest.mark.parametrize('path', sorted(glob.glob(os.path.join(lms.DATA_DIR, 'tab_*_p_*_*.csv'))),
+                         ids=os.path.basename)
+def test_published_centiles_round_trip(path):
+    table = np.genfromtxt(path, delimiter=',', names=True)
+    for column, z in CENTILE_Z.items():
+        # Centiles are published to 0.1 (cm, kg or kg/m2)
+        value = lms.lms_value(z, table['L'], table['M'], table['S'])
+        np.testing.assert_allclose(value, table[column], atol=0.05 + 1e-9)
+        np.testing.assert_allclose(lms.lms_zscore(value, table['L'], table['M'], table['S']), z, atol=1e-9)
+
+
+@pytest.mark.parametrize('measurement_type', ['height', 'weight', 'head', 'bmi'])
+def test_engine_scores_each_band_on_its_own_rows(engine, measurement_type):
+    for sex in lms.SEX_CODES.values():
+        bands = sorted(engine.bands[(sex, measurement_type, 'age')], key=lambda band: band.min_age)
+        for band, later in zip(bands, bands[1:] + [None]):
+            # The later band applies from the seam age on
+            rows = band.ages < later.min_age if later is not None else np.ones(len(band.ages), dtype=bool)
+            for z in CENTILE_Z.values():
+                value = lms.lms_value(z, band.L[rows], band.M[rows], band.S[rows])
+                scored = engine.zscores(sex, band.ages[rows], value, measurement_type)
+                np.testing.assert_allclose(scored, z, atol=1e-9)
+
+
+def test_restricted_extrapolation_beyond_3_sd(engine):
+    # Weight-for-age is skewed (L != 1), so the restricted and plain LMS z-scores differ there
+    table = read_table('tab_wfa_girls_p_0_5')
+    L, M, S = table['L'][12], table['M'][12], table['S'][12]
+    sd2, sd3 = lms.lms_value(2, L, M, S), lms.lms_value(3, L, M, S)
+    sd2_neg, sd3_neg = lms.lms_value(-2, L, M, S), lms.lms_value(-3, L, M, S)
+
+    weights = [sd3, sd3 + 0.5 * (sd3 - sd2), sd3 + 2 * (sd3 - sd2), sd3_neg, sd3_neg - 0.5 * (sd2_neg - sd3_neg)]
+    z = engine.zscores('Girl', 12, weights, 'weight')
+    np.testing.assert_allclose(z, [3, 3.5, 5, -3, -3.5], atol=1e-9)
+    plain = ((weights[2] / M) ** L - 1) / (L * S)
+    assert abs(plain - 5) > 0.1
+
+
+def test_length_height_correction_at_the_24_month_seam(engine):
+    height_2_5 = read_table('tab_lhfa_boys_p_2_5')
+    recumbent = read_table('tab_lhfa_boys_p_0_2')['M'][-1]
+    standing = height_2_5['M'][0]
+    assert recumbent - standing == pytest.approx(lms.LENGTH_HEIGHT_OFFSET)
+
+    # From 24 months the standing height table applies: a recumbent length is 0.7 cm taller
+    z = engine.zscores('Boy', [24, 24], [recumbent, standing], 'height', position=['recumbent', 'standing'])
+    np.testing.assert_allclose(z, 0, atol=1e-9)
+    # Below 24 months the recumbent length table applies: a standing height is 0.7 cm shorter
+    below = engine.zscores('Boy', [23.5, 23.5], [80.7, 80.0], 'height', position=['recumbent', 'standing'])
+    assert below[0] == pytest.approx(below[1], abs=1e-9)
+    # Without a position, a measurement at 24 months is taken as a standing height
+    unadjusted = lms.lms_zscore(recumbent, height_2_5['L'][0], standing, height_2_5['S'][0])
+    assert engine.zscores('Boy', 24, recumbent, 'height')[0] == pytest.approx(unadjusted)
+    assert unadjusted > 0.2
+
+
+def test_score_visits_applies_the_seam_correction(engine, tmp_path):
+    visits = pd.DataFrame({
+        'sex': ['M', 'M', 'M', 'M'],
+        'age_months': [24.0, 24.0, 23.5, 23.5],
+        'length': [87.8161, 87.1161, 80.7, 80.0],
+        'weight': [12.0, 12.0, 11.0, 11.0],
+        'position': ['recumbent', 'standing', 'recumbent', 'standing'],
+    })
+    visits.to_csv(tmp_path / 'visits.csv', index=False)
+    assert score_visits.main([str(tmp_path / 'visits.csv'), str(tmp_path / 'scored.csv')]) == 0
+
+    scored = pd.read_csv(tmp_path / 'scored.csv')
+    np.testing.assert_allclose(scored['height_z'][:2], 0, atol=1e-6)
+    assert scored['height_z'][2] == pytest.approx(scored['height_z'][3])
+    # Each pair measured the same child, so every indicator using length agrees
+    for indicator in ['bmi_z', 'weight_for_length_z']:
+        assert scored[indicator][0] == pytest.approx(scored[indicator][1])
+        assert scored[indicator][2] == pytest.approx(scored[indicator][3])
+    expected = engine.score_visits('Boy', visits['age_months'], visits['length'], visits['weight'],
+                                   position=visits['position'])
+    np.testing.assert_allclose(scored['height_z'], expected['height'][0])
@@ -0,0 +1,50 @@
+# Compiled reference cache: unusable caches fall back to the CSVs
+import glob
+import json
+import os
+import shutil
+import struct
+
+import pytest
+
+import lms
+import refcache
+
+
+@pytest.fixture
+def cache_path(tmp_path):
+    for path in glob.glob(os.path.join(lms.DATA_DIR, 'tab_*.csv')):
+        shutil.copy(path, tmp_path)
+    path = str(tmp_path / 'reference_tables.bin')
+    refcache.build_cache(path, str(tmp_path))
+    refcache.open_cache.cache_clear()
+    yield path
+    refcache.open_cache.cache_clear()
+
+
+def test_open_cache_maps_a_current_cache(cache_path):
+    cache = refcache.open_cache(cache_path)
+    assert cache is not None and cache.has_table('tab_lhfa_boys_p_0_2')
+
+
+def test_open_cache_ignores_a_corrupt_payload(cache_path):
+    with open(cache_path, 'r+b') as f:
+        f.seek(-8, os.SEEK_END)
+        f.write(b'\x01' * 8)
+    with pytest.warns(UserWarning, match='checksum'):
+        assert refcache.open_cache(cache_path) is None
+
+
+def test_open_cache_ignores_another_format_version(cache_path):
+    with open(cache_path, 'rb') as f:
+        data = f.read()
+    (length,) = struct.unpack('<I', data[8:12])
+    header = json.loads(data[12:12 + length])
+    header['format_version'] = refcache.FORMAT_VERSION + 1
+    # Same length, so the payload stays aligned
+    header_bytes = json.dumps(header, sort_keys=True).encode()
+    assert len(header_bytes) == length
+    with open(cache_path, 'wb') as f:
+        f.write(data[:12] + header_bytes + data[12 + length:])
+    with pytest.warns(UserWarning, match='format version'):
+        assert refcache.open_cache(cache_path) is None
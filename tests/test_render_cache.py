@@ -0,0 +1,65 @@
+# Rendered page cache for shared links: keys, expiry, eviction and counters
+import render_cache
+
+
+class Clock:
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def test_render_key_normalizes_the_inputs():
+    key = render_cache.render_key("Girl", "0-2 years", 12, 81.2, 10.9)
+    # Values parsed from '81.20', '12' or an int weight are the same page
+    assert render_cache.render_key("Girl", "0-2 years", 12.0, float('81.20'), 10.9) == key
+    assert render_cache.render_key("Girl", "0-2 years", "12", "81.2", "10.9") == key
+    assert render_cache.render_key("Girl", "0-2 years", 12, 81.2, 11) == \
+        render_cache.render_key("Girl", "0-2 years", 12, 81.2, 11.0)
+    # Measurements are exact: values that round alike are still different pages
+    assert render_cache.render_key("Girl", "0-2 years", 12, 81.24, 10.9) != \
+        render_cache.render_key("Girl", "0-2 years", 12, 81.16, 10.9)
+    assert render_cache.render_key("Girl", "0-2 years", 12, 81.2, 10.9, head=45) != key
+    assert render_cache.render_key("Girl", "0-2 years", 12, 81.2, 10.9, chart="Height") != key
+    assert render_cache.render_key("Girl", "0-2 years", 12, 81.2, 10.9, curve_set="SD lines (-3 to +3)") != key
+
+
+def test_entries_expire_after_the_ttl():
+    clock = Clock()
+    cache = render_cache.RenderCache(maxsize=4, ttl=60, clock=clock)
+    cache.put('page', {'age': '1 year'})
+    clock.now = 60
+    assert cache.get('page') == {'age': '1 year'}
+    clock.now = 60.5
+    assert cache.get('page') is None
+    assert cache.stats()['expirations'] == 1 and cache.stats()['size'] == 0
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = render_cache.RenderCache(maxsize=2, ttl=60, clock=Clock())
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1
+    cache.put('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_hit_and_miss_counters():
+    cache = render_cache.RenderCache(maxsize=4, ttl=60, clock=Clock())
+    computed = []
+
+    def compute():
+        computed.append(1)
+        return 'page'
+
+    assert [cache.get_or_compute('key', compute) for _ in range(4)] == ['page'] * 4
+    assert cache.get('other') is None
+    stats = cache.stats()
+    assert len(computed) == 1
+    assert (stats['hits'], stats['misses'], stats['size']) == (3, 2, 1)
+    assert stats['hit_rate'] == 3 / 5
+    cache.clear()
+    assert cache.stats()['size'] == 0
@@ -0,0 +1,24 @@
+# Scoring service request validation
+import pytest
+
+import score_service
+
+
+@pytest.mark.parametrize('payload', [
+    {'sex': 'Girl', 'age_months': [6, 9.5], 'length': [[66.1, 70.4]]},
+    {'sex': [['Girl', 'Boy']], 'age_months': [6, 9.5], 'length': [66.1, 70.4]},
+    {'sex': 'Girl', 'age_months': [6, 9.5], 'length': [66.1, 70.4], 'position': [['standing']]},
+    {'sex': [['Girl'], ['Boy', 'Girl']], 'age_months': [6, 9.5], 'length': [66.1, 70.4]},
+    {'sex': 'Girl', 'age_months': [6, 9.5], 'weight': [[7.2], [8.1]]},
+])
+def test_nested_arrays_are_request_errors(payload):
+    with pytest.raises(score_service.RequestError):
+        score_service.parse_request(payload)
+
+
+def test_flat_request_is_broadcast():
+    sex, age, position, measurements = score_service.parse_request(
+        {'sex': 'Girl', 'age_months': [6, 9.5], 'length': [66.1, 70.4], 'weight': 7.2})
+    assert list(sex) == ['Girl', 'Girl']
+    assert position is None
+    assert measurements['weight'].shape == age.shape == (2,)
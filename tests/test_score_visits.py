@@ -0,0 +1,74 @@
+# Batch scorer regressions
+import pandas as pd
+
+import score_visits
+
+
+def late_typed_visits(path, rows=30_000, empty_rows=20_000):
+    """Visit CSV whose position and clinic columns are empty for the first empty_rows rows.
+
+    clinic is not a column the scorer knows about, so it is only passed through.
+    """
+    visits = pd.DataFrame({
+        'patient_id': [f'P{i % 5000}' for i in range(rows)],
+        'sex': ['M', 'F'] * (rows // 2),
+        'age_months': [(i % 600) / 10 for i in range(rows)],
+        'length': [50 + (i % 600) / 10 for i in range(rows)],
+        'weight': [3 + (i % 170) / 10 for i in range(rows)],
+        'position': [None] * empty_rows + ['standing'] * (rows - empty_rows),
+        'clinic': [None] * empty_rows + ['North'] * (rows - empty_rows),
+    })
+    visits.to_csv(path, index=False)
+    return visits
+
+
+def test_parquet_output_with_late_typed_column(tmp_path):
+    late_typed_visits(tmp_path / 'visits.csv')
+    output = tmp_path / 'scored.parquet'
+    assert score_visits.main([str(tmp_path / 'visits.csv'), str(output), '--chunk-size', '5000']) == 0
+
+    scored = pd.read_parquet(output)
+    assert len(scored) == 30_000
+    assert scored['position'].isna().sum() == 20_000
+    assert (scored['position'].iloc[20_000:] == 'standing').all()
+    assert (scored['clinic'].iloc[20_000:] == 'North').all()
+
+
+def test_partitioned_output_with_late_typed_column(tmp_path):
+    visits = late_typed_visits(tmp_path / 'visits.csv')
+    output = tmp_path / 'scored'
+    assert score_visits.main([str(tmp_path / 'visits.csv'), str(output), '--partition', '--chunk-size', '5000']) == 0
+
+    scored = pd.read_parquet(output)
+    assert len(scored) == len(visits)
+    assert (scored['position'] == 'standing').sum() == 10_000
+    assert (scored['clinic'] == 'North').sum() == 10_000
+
+
+def test_status_labels_use_indicator_display_names(tmp_path):
+    pd.DataFrame({
+        'sex': ['F', 'F'],
+        'age_months': [12.0, 36.0],
+        'length': [74.0, 95.0],
+        'weight': [9.0, 14.0],
+        'head_circumference': [45.0, 49.0],
+    }).to_csv(tmp_path / 'visits.csv', index=False)
+    output = tmp_path / 'scored.parquet'
+    assert score_visits.main([str(tmp_path / 'visits.csv'), str(output)]) == 0
+
+    scored = pd.read_parquet(output)
+    assert scored['head_status'].str.endswith('(head circumference)').all()
+    assert scored['bmi_status'].str.endswith('(BMI-for-age)').all()
+    assert scored['weight_for_length_status'][0].endswith('(weight-for-length)')
+    assert scored['weight_for_length_status'][1].endswith('(weight-for-height)')
+
+
+def test_parallel_scoring_of_a_header_only_file(tmp_path):
+    (tmp_path / 'visits.csv').write_text('patient_id,sex,age_months,length,weight\n')
+    for suffix in ['.csv', '.parquet']:
+        single, parallel = tmp_path / f'single{suffix}', tmp_path / f'parallel{suffix}'
+        assert score_visits.main([str(tmp_path / 'visits.csv'), str(single)]) == 0
+        assert score_visits.main([str(tmp_path / 'visits.csv'), str(parallel), '--workers', '2']) == 0
+        read = pd.read_parquet if suffix == '.parquet' else pd.read_csv
+        assert read(parallel).columns.tolist() == read(single).columns.tolist()
+        assert 'height_z' in read(parallel).columns and len(read(parallel)) == 0
@@ -0,0 +1,44 @@
+# WHO growth velocity standards against their published increment centiles
+import numpy as np
+import pytest
+
+import lms
+import refcache
+import velocity
+
+# Published centile columns and the z-score each one sits at
+CENTILE_Z = {'P3': -1.880794, 'P15': -1.036433, 'P50': 0.0, 'P85': 1.036433, 'P97': 1.880794}
+
+
+@pytest.fixture(scope='module')
+def engine():
+    return velocity.load_velocity_engine()
+
+
+@pytest.mark.parametrize('code, interval, measurement_type, tolerance', [
+    ('wv', '1mon', 'weight', 0.005),
+    ('wv', '2mon', 'weight', 0.005),
+    # Length increments are published to 0.1 cm
+    ('lv', '2mon', 'height', 0.07),
+])
+def test_published_centiles_round_trip(engine, code, interval, measurement_type, tolerance):
+    for sex_code, sex in lms.SEX_CODES.items():
+        table = refcache.read_table(f'tab_{code}_{sex_code}_p_{interval}')
+        for column, z in CENTILE_Z.items():
+            increment = np.asarray(table[column], dtype=float) / velocity.UNIT_SCALE[measurement_type]
+            scored = engine.zscores(sex, table['StartMonth'], table['EndMonth'], 0.0, increment, measurement_type)
+            np.testing.assert_allclose(scored, z, atol=tolerance)
+
+
+def test_first_one_month_interval_is_four_weeks(engine):
+    table = refcache.read_table('tab_wv_girls_p_1mon')
+    # Birth to 4 weeks is row 0 and 1 to 2 months row 1, each at its own median
+    medians = np.asarray(table['P50'][:2], dtype=float) / 1000
+    z = engine.zscores('Girl', [0.0, 1.0], [0.92, 2.0], 0.0, medians, 'weight')
+    np.testing.assert_allclose(z, 0, atol=0.005)
+
+
+def test_intervals_not_tabulated_are_not_scored(engine):
+    # 1.5 and 3 months apart, and 2 months apart past the tables' last start
+    z = engine.zscores('Boy', [6.0, 6.0, 30.0], [7.5, 9.0, 32.0], 70.0, 72.0, 'height')
+    assert np.isnan(z).all()
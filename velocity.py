@@ -0,0 +1,139 @@
+# WHO growth velocity standards: z-scores / percentiles for increments between visits
+#
+# Tables (tab_lv_*, tab_wv_*) hold one row per increment interval, e.g. the
+# 2-month length increment from 3 to 5 months. Weight increments are in grams
+# and were shifted by a constant (Delta) before the LMS fit, so the same
+# Delta is added back before computing z-scores.
+#
+# Increments are scored as measured against the table whose interval matches
+# the time between the visits, as WHO tabulates them; visit pairs further
+# than INTERVAL_TOLERANCE from every tabulated interval have no z-score
+# (increments are not rescaled to another interval length).
+import numpy as np
+
+import lms
+import refcache
+
+# Velocity tables per measurement type: WHO file code and increment interval
+VELOCITY_TABLES = {
+    'height': [('lv', '2mon')],
+    'weight': [('wv', '1mon'), ('wv', '2mon')],
+}
+
+# Table units per app unit (length cm -> cm, weight kg -> g)
+UNIT_SCALE = {
+    'height': 1.0,
+    'weight': 1000.0,
+}
+
+# Months a visit interval (or its start) may differ from a tabulated interval
+# and still be scored against it: about one week, for ages taken from dates
+INTERVAL_TOLERANCE = 0.25
+
+
+class VelocityTable:
+    """One WHO increment table: Delta, L, M, S per (start month, end month) interval."""
+
+    def __init__(self, start, end, delta, L, M, S):
+        self.start = np.asarray(start, dtype=float)
+        self.end = np.asarray(end, dtype=float)
+        self.delta = np.asarray(delta, dtype=float)
+        self.L = np.asarray(L, dtype=float)
+        self.M = np.asarray(M, dtype=float)
+        self.S = np.asarray(S, dtype=float)
+        # Nominal interval length (the first WHO 1-month interval is 4 weeks)
+        self.interval = float(np.median(self.end - self.start))
+
+    @classmethod
+    def from_columns(cls, columns):
+        return cls(columns['StartMonth'], columns['EndMonth'], columns['Delta'],
+                   columns['L'], columns['M'], columns['S'])
+
+    def rows(self, start_age):
+        """Row whose interval starts closest to each start age (-1 if none within INTERVAL_TOLERANCE)."""
+        start_age = np.asarray(start_age, dtype=float)
+        # Nearest of the tabulated starts on either side (they need not be evenly spaced)
+        after = np.clip(np.searchsorted(self.start, start_age), 1, len(self.start) - 1)
+        before = after - 1
+        row = np.where(np.abs(start_age - self.start[before]) <= np.abs(start_age - self.start[after]),
+                       before, after)
+        with np.errstate(invalid='ignore'):
+            valid = np.abs(start_age - self.start[row]) <= INTERVAL_TOLERANCE
+        return np.where(valid, row, -1)
+
+    def zscores(self, start_age, duration, increment):
+        """Z-scores of increments (table units) over durations in months; NaN where the table doesn't apply."""
+        row = self.rows(start_age)
+        with np.errstate(invalid='ignore'):
+            applies = (row >= 0) & (np.abs(duration - (self.end[row] - self.start[row])) <= INTERVAL_TOLERANCE)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            z = lms.lms_zscore(increment + self.delta[row], self.L[row], self.M[row], self.S[row])
+        return np.where(applies, z, np.nan)
+
+
+class VelocityEngine:
+    """Scores arrays of visit pairs against the WHO velocity standards."""
+
+    def __init__(self):
+        self.tables = {}
+
+    def add_table(self, sex, measurement_type, table):
+        self.tables.setdefault((sex, measurement_type), []).append(table)
+
+    def has_indicator(self, sex, measurement_type):
+        return (sex, measurement_type) in self.tables
+
+    def zscores(self, sex, start_age, end_age, start_value, end_value, measurement_type="height"):
+        """Velocity z-scores for arrays of visit pairs (ages in months, app units).
+
+        Each pair is scored against the table whose interval is closest to
+        the time between the visits; pairs no table covers are NaN.
+        """
+        start_age, end_age, start_value, end_value = np.broadcast_arrays(
+            *(np.atleast_1d(np.asarray(a, dtype=float)) for a in (start_age, end_age, start_value, end_value)))
+        sex = np.broadcast_to(np.asarray(sex), start_age.shape)
+        duration = end_age - start_age
+        increment = (end_value - start_value) * UNIT_SCALE[measurement_type]
+
+        z = np.full(start_age.shape, np.nan)
+        for (table_sex, table_type), tables in self.tables.items():
+            if table_type != measurement_type:
+                continue
+            mask = sex == table_sex
+            if not mask.any():
+                continue
+            # Try tables from the closest interval to the furthest; keep the first that applies
+            fit = np.full(mask.sum(), np.nan)
+            order = np.argsort([np.abs(duration[mask] - t.interval) for t in tables], axis=0)
+            candidates = [t.zscores(start_age[mask], duration[mask], increment[mask]) for t in tables]
+            candidates = np.array(candidates)
+            for rank in range(len(tables)):
+                choice = candidates[order[rank], np.arange(mask.sum())]
+                fit = np.where(np.isnan(fit), choice, fit)
+            z[mask] = fit
+        return z
+
+    def score(self, sex, start_age, end_age, start_value, end_value, measurement_type="height"):
+        """Return (z-scores, percentiles) for arrays of visit pairs."""
+        z = self.zscores(sex, start_age, end_age, start_value, end_value, measurement_type)
+        return z, lms.zscore_to_percentile(z)
+
+    def series_zscores(self, sex, ages, values, measurement_type="height"):
+        """Velocity z-score for every consecutive pair of visits (ages sorted, NaN values skipped)."""
+        ages = np.asarray(ages, dtype=float)
+        values = np.asarray(values, dtype=float)
+        measured = ~np.isnan(values)
+        ages, values = ages[measured], values[measured]
+        return self.zscores(sex, ages[:-1], ages[1:], values[:-1], values[1:], measurement_type)
+
+
+def load_velocity_engine():
+    """VelocityEngine over the tab_lv_* / tab_wv_* tables (compiled cache or CSVs)."""
+    engine = VelocityEngine()
+    for measurement_type, tables in VELOCITY_TABLES.items():
+        for code, interval in tables:
+            for sex_code, sex in lms.SEX_CODES.items():
+                columns = refcache.read_table(f'tab_{code}_{sex_code}_p_{interval}')
+                if columns is not None:
+                    engine.add_table(sex, measurement_type, VelocityTable.from_columns(columns))
+    return engine